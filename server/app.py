@@ -1,37 +1,49 @@
 import os
+import time
+import asyncio
 import shutil
+import json
 import pickle
+import hashlib
+import io
+import zipfile
+import atexit
+import threading
+import importlib
+import itertools
+import multiprocessing
+try:
+    import fcntl
+    import resource
+except ImportError:  # not available on Windows
+    fcntl = None
+    resource = None
+import joblib
 import numpy as np
 from typing import List
+from functools import partial, lru_cache
+from contextlib import closing, contextmanager
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from threadpoolctl import threadpool_limits
 
 # FastAPI and WebSocket imports
 from pydantic import BaseModel
-from fastapi import FastAPI, WebSocket
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, BackgroundTasks, Request
+from starlette.datastructures import UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response
 
-# signal processing
-from scipy.signal import medfilt
-from scipy.signal import butter, filtfilt, iirnotch
+# signal processing, scipy.signal is imported by the filters on first use
+from scipy.ndimage import median_filter
+from scipy.sparse import csr_matrix
 
 # stencil generation
 import xml.etree.ElementTree as ET
-from reportlab.lib.pagesizes import letter
-
-# classifiers
-import xgboost as xgb
-from sklearn.svm import SVC
-from sklearn.naive_bayes import GaussianNB
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import StratifiedKFold, cross_val_predict
-from sklearn.metrics import accuracy_score, f1_score, confusion_matrix
-
-# metrics
-import shap
-from sklearn.inspection import permutation_importance
-from sklearn.feature_selection import mutual_info_classif
+
+# sklearn, xgboost and shap are imported on first use: classifiers and ranking metrics are
+# lazily imported plugins, see PluginRegistry, and model selection is imported by the sweep
 
 app = FastAPI()
 
@@ -50,39 +62,723 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 np.random.seed(42)
 
-def get_data(ds_number, selected_gestures, channels, ds_filename):    
-    gestures = {}
-    
-    filename = ""
+TRACE_DIR = os.environ.get("SPARSEEMG_TRACE_DIR")  # per-job trace files are only written when set
+STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and histograms rendered in the Prometheus text format.
+
+    A series is a metric name plus its label values; every name is declared once with its
+    type and help text. Collectors registered with collect() run on every render and can
+    set gauges from state kept elsewhere, e.g. the cache hit counters.
+    """
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.collectors = []
+        self._types = OrderedDict()
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self._types[name] = (kind, text)
+
+    def collect(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._series[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # cumulative bucket counts, then sum and count
+            histogram = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self):
+        for fn in self.collectors:
+            fn(self)
+
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: str(item[0]))
+
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def labels_text(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+        lines = []
+        for name, (kind, text) in self._types.items():
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            for (series_name, labels), value in series:
+                if series_name != name:
+                    continue
+                if kind == "histogram":
+                    for bound, count in zip(self.buckets + ("+Inf",), value[:-2] + [value[-1]]):
+                        lines.append(f"{name}_bucket{labels_text(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_sum{labels_text(labels)} {value[-2]}")
+                    lines.append(f"{name}_count{labels_text(labels)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{labels_text(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+metrics.describe("sparseemg_stage_seconds", "histogram", "Duration of training pipeline stages.")
+metrics.describe("sparseemg_stage_samples_total", "counter", "EMG samples processed by training pipeline stages.")
+metrics.describe("sparseemg_peak_rss_bytes", "gauge", "Peak resident set size of the server process.")
+metrics.describe("sparseemg_training_requests_total", "counter", "Training requests by outcome.")
+metrics.describe("sparseemg_training_request_seconds", "histogram", "Duration of training requests, queueing included.")
+metrics.describe("sparseemg_jobs", "gauge", "Training jobs running or waiting for a slot.")
+metrics.describe("sparseemg_cancelled_jobs_total", "counter", "Training jobs cancelled because no client waited for them, by stage.")
+metrics.describe("sparseemg_cancelled_job_seconds_total", "counter", "Seconds cancelled training jobs had run when they were cancelled.")
+metrics.describe("sparseemg_abandoned_tasks_total", "counter", "CV fits scheduled but never used, e.g. those of cancelled jobs.")
+metrics.describe("sparseemg_terminated_workers_total", "counter", "Sweep pool processes killed to stop the fits of cancelled jobs.")
+metrics.describe("sparseemg_cache_hits_total", "counter", "Cache hits.")
+metrics.describe("sparseemg_cache_misses_total", "counter", "Cache misses.")
+metrics.describe("sparseemg_cache_hit_ratio", "gauge", "Share of cache lookups that hit.")
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, 0 where it is not available."""
+    if resource is None:
+        return 0
+    # kilobytes on Linux, bytes on macOS
+    scale = 1 if os.uname().sysname == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def samples_count(gestures):
+    if isinstance(gestures, GestureDataset):
+        return int(gestures.lengths.sum())
+    return sum(len(sample) for samples in gestures.values() for sample in samples)
+
+class JobTrace:
+    """
+    Timed spans of one training job.
+
+    Every span observes its duration in the stage histogram, labelled with the stage and the
+    job's classifier and metric, and counts the samples it processed. The spans, with the
+    peak RSS at their end and the counts set on them, are kept and written as a JSON file
+    to TRACE_DIR when the job has an id and TRACE_DIR is set.
+    """
+
+    def __init__(self, job_id=None, **labels):
+        self.job_id = job_id
+        self.labels = labels
+        self.spans = []
+        self.started = time.monotonic()
+
+    @contextmanager
+    def span(self, stage, **counts):
+        """Time the body; it may add counts such as samples or features to the yielded dict."""
+        record = {"stage": stage, "start": round(time.monotonic() - self.started, 4), **counts}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - started
+            record["seconds"] = round(seconds, 4)
+            record["peak_rss_bytes"] = peak_rss()
+            if record.get("samples"):
+                record["samples_per_second"] = round(record["samples"] / max(seconds, 1e-9))
+                metrics.inc("sparseemg_stage_samples_total", record["samples"], stage=stage)
+            metrics.observe("sparseemg_stage_seconds", seconds, stage=stage, **self.labels)
+            metrics.set("sparseemg_peak_rss_bytes", record["peak_rss_bytes"])
+            self.spans.append(record)
+
+    def write(self, **summary):
+        if not TRACE_DIR or not self.job_id:
+            return
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        trace = {"job_id": self.job_id, "labels": self.labels, "spans": self.spans, **summary}
+        with open(os.path.join(TRACE_DIR, f"{self.job_id}-{int(time.time())}.json"), "w") as f:
+            json.dump(trace, f, indent=1)
+
+DATASET_CACHE_BYTES = int(os.environ.get("SPARSEEMG_DATASET_CACHE_BYTES", 2 * 1024 ** 3))
+# float32 halves datasets, int16 with a per-channel scale quarters them, float64 keeps them lossless
+DATASET_DTYPE = np.dtype(os.environ.get("SPARSEEMG_DATASET_DTYPE", "float32"))
+
+def file_digest(filename, chunk_size=1 << 20):
+    """Compute the SHA-256 hex digest of a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def gestures_nbytes(gestures):
+    """Total size in bytes of the sample arrays of a gesture dict or GestureDataset."""
+    if isinstance(gestures, GestureDataset):
+        return gestures.nbytes
+    return sum(sample.nbytes for samples in gestures.values() for sample in samples)
+
+class DatasetCache:
+    """
+    Process-wide LRU cache of loaded gesture datasets.
+
+    Entries are keyed by file path and validated against the file's mtime and size;
+    when those change the content hash decides whether the file has to be reloaded.
+    The cache is bounded by the total size of the cached sample arrays, mapped files
+    included. Cached arrays are read-only, so callers must copy before modifying a sample.
+    """
+
+    def __init__(self, max_bytes=DATASET_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        """
+        Return the dataset stored in filename, loading it if it is not cached or stale.
+
+        Columnar datasets and pickles attached from the shared store are memory-mapped,
+        pickles that cannot be shared are packed in memory; both are GestureDataset.
+        """
+        signature = dataset_signature(filename)
+
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry["signature"] == signature:
+                self._entries.move_to_end(filename)
+                self.hits += 1
+                return entry["gestures"]
+
+        digest = dataset_digest(filename)
+
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry["digest"] == digest:
+                # touched but unchanged file, keep the loaded arrays
+                entry["signature"] = signature
+                self._entries.move_to_end(filename)
+                self.hits += 1
+                return entry["gestures"]
+
+        # pickles are mapped from the shared store when possible, see SharedDatasetStore
+        shared = self._attach_shared(filename, digest) if SHARED_DATASETS and not os.path.isdir(filename) else None
+
+        if os.path.isdir(filename) or shared is not None:
+            gestures = shared if shared is not None else GestureDataset.open(filename)
+        else:
+            gestures = GestureDataset.from_gestures(load_gestures(filename))
+
+        # mapped files count as well: evicting them releases shared copies and their leases
+        nbytes = gestures_nbytes(gestures)
+
+        with self._lock:
+            self.misses += 1
+            self._store(filename, {
+                "signature": signature,
+                "digest": digest,
+                "gestures": gestures,
+                "nbytes": nbytes,
+                "shared": digest if shared is not None else None,
+            })
+
+        return gestures
+
+    @staticmethod
+    def _attach_shared(filename, digest):
+        try:
+            return shared_datasets.attach(filename, digest)
+        except (OSError, TypeError, ValueError):
+            # no space left in the shared directory or keys the columnar layout cannot hold
+            return None
+
+    def digest(self, filename):
+        """Return the content hash of a dataset file without loading it, reusing the hash of a current entry."""
+        signature = dataset_signature(filename)
+
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry["signature"] == signature:
+                return entry["digest"]
+
+        return dataset_digest(filename)
+
+    def invalidate(self, filename=None):
+        """Drop one entry, or every entry if no filename is given."""
+        with self._lock:
+            for name in list(self._entries) if filename is None else [filename]:
+                if name in self._entries:
+                    self._drop(name)
+
+    def _drop(self, filename):
+        entry = self._entries.pop(filename)
+        self.nbytes -= entry["nbytes"]
+        if entry.get("shared"):
+            shared_datasets.release(entry["shared"])
+
+    def _store(self, filename, entry):
+        if filename in self._entries:
+            self._drop(filename)
+
+        self._entries[filename] = entry
+        self.nbytes += entry["nbytes"]
+
+        # evict least recently used datasets, but always keep the newest one
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)))
+
+dataset_cache = DatasetCache()
+
+# leases rely on flock and on probing pids, so datasets are only shared on POSIX systems
+SHARED_DATASETS = fcntl is not None and os.environ.get("SPARSEEMG_SHARED_DATASETS", "1") != "0"
+SHARED_DATASET_DIR = os.environ.get("SPARSEEMG_SHARED_DATASET_DIR", "cache/shared")
+
+class SharedDatasetStore:
+    """
+    Pickled datasets converted once per content hash into the columnar layout, in a
+    directory shared by all server and training processes.
+
+    Every process maps the same files read-only, so a dataset is held in memory once,
+    in the page cache, however many uvicorn workers use it; pointing the directory at
+    /dev/shm keeps it in RAM. A process attaching a dataset holds a lease file for it,
+    and the dataset is deleted once no running process holds a lease.
+    """
+
+    def __init__(self, path=SHARED_DATASET_DIR):
+        self.path = path
+        self._attached = {}
+        self._lock = threading.Lock()
+
+    def _dataset(self, digest):
+        # processes configured with another dtype keep their own copy
+        return os.path.join(self.path, f"{digest}-{DATASET_DTYPE}{COLUMNAR_SUFFIX}")
+
+    def _lease(self, digest, pid):
+        return os.path.join(self.path, "leases", f"{digest}-{pid}")
+
+    @contextmanager
+    def _locked(self, digest):
+        """Serialize conversion and cleanup of one dataset across processes."""
+        os.makedirs(os.path.join(self.path, "leases"), exist_ok=True)
+        with open(os.path.join(self.path, f"{digest}.lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def attach(self, filename, digest):
+        """Map the shared copy of the pickled dataset filename, converting it if no process has yet."""
+        with self._locked(digest):
+            if not os.path.isdir(self._dataset(digest)):
+                convert_to_columnar(load_gestures(filename), self._dataset(digest), source_digest=digest)
+            open(self._lease(digest, os.getpid()), "w").close()
+            dataset = GestureDataset.open(self._dataset(digest))
+
+        with self._lock:
+            self._attached[digest] = self._attached.get(digest, 0) + 1
+        return dataset
+
+    def release(self, digest):
+        """Drop one reference of this process; the last one drops the lease and maybe the dataset."""
+        with self._lock:
+            self._attached[digest] -= 1
+            if self._attached[digest] > 0:
+                return
+            del self._attached[digest]
+
+        with self._locked(digest):
+            try:
+                os.remove(self._lease(digest, os.getpid()))
+            except OSError:
+                pass
+            if not self._in_use(digest):
+                # processes that still map the files keep their pages until they unmap them
+                shutil.rmtree(self._dataset(digest), ignore_errors=True)
+
+    def release_all(self):
+        for digest in list(self._attached):
+            self._attached[digest] = 1
+            self.release(digest)
+
+    def _in_use(self, digest):
+        leases = os.path.join(self.path, "leases")
+        for name in os.listdir(leases):
+            lease_digest, _, pid = name.rpartition("-")
+            if lease_digest != digest:
+                continue
+            try:
+                os.kill(int(pid), 0)
+                return True
+            except PermissionError:
+                return True
+            except (OSError, ValueError):
+                # lease of a process that is gone
+                os.remove(os.path.join(leases, name))
+        return False
+
+shared_datasets = SharedDatasetStore()
+atexit.register(shared_datasets.release_all)
+
+def load_gestures(filename):
+    """Load a pickled gesture dict of the form {gesture: [(samples, channels) arrays]}."""
+    with open(filename, 'rb') as f:
+        gestures = pickle.load(f)
+
+    return {g: [np.asarray(sample) for sample in samples] for g, samples in gestures.items()}
+
+def quantization_scale(samples):
+    """Per-channel scale mapping the largest absolute value of samples onto the int16 range."""
+    peak = np.max([np.abs(sample).max(axis=0, initial=0) for sample in samples], axis=0)
+    scale = (peak / np.iinfo(np.int16).max).astype(np.float32)
+    scale[scale == 0] = 1
+    return scale
+
+def store_samples(sample, dtype, scale=None):
+    """Convert a trial to the storage dtype, quantizing it with scale for integer dtypes."""
+    if scale is None:
+        return np.asarray(sample).astype(dtype, copy=False)
+    return np.rint(sample / scale).astype(dtype)
+
+class GestureDataset:
+    """
+    Compact gesture dataset: every trial in one contiguous buffer.
+
+    The buffer holds float32 samples by default (float64 or int16 with a per-channel scale
+    through SPARSEEMG_DATASET_DTYPE). Trials are rows offsets[i]:offsets[i] + lengths[i]
+    of the buffer, grouped by gesture in key order; labels are positions in gestures.
+    Datasets packed in memory come from from_gestures, datasets written by
+    convert_to_columnar are memory-mapped by open, together with their channel-major copy
+    of the buffer, so selecting channels only touches the pages of the selected channels.
+
+    Selecting gestures and channels returns a dataset sharing the buffers. The channel index
+    is applied when trials are read, as views for slices, and int16 samples are scaled back
+    to float32 then. The dataset reads like a gesture dict, {gesture: [trials]}, so every
+    function taking a gesture dict accepts it.
+    """
+
+    __slots__ = ("buffer", "offsets", "lengths", "labels", "gestures", "channels", "scale", "columns", "path")
+
+    def __init__(self, buffer, offsets, lengths, labels, gestures, channels=None, scale=None, columns=None, path=None):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.lengths = lengths
+        self.labels = labels
+        self.gestures = tuple(gestures)
+        self.channels = channels
+        self.scale = scale
+        self.columns = columns
+        self.path = path
+
+    @classmethod
+    def from_gestures(cls, gestures, dtype=DATASET_DTYPE):
+        """Pack a gesture dict into a read-only buffer of dtype."""
+        dtype = np.dtype(dtype)
+        keys = list(gestures.keys())
+        trials = [(i, sample) for i, g in enumerate(keys) for sample in gestures[g]]
+
+        lengths = np.array([len(sample) for _, sample in trials], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        scale = quantization_scale([sample for _, sample in trials]) if dtype.kind == "i" else None
+
+        buffer = np.empty((int(lengths.sum()), trials[0][1].shape[1]), dtype=dtype)
+        for (_, sample), a, n in zip(trials, offsets, lengths):
+            buffer[a:a + n] = store_samples(sample, dtype, scale)
+        buffer.flags.writeable = False
+
+        return cls(buffer, offsets, lengths, np.array([i for i, _ in trials], dtype=np.int64), keys, scale=scale)
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map the dataset written to the directory path by convert_to_columnar."""
+        with open(os.path.join(path, "meta.json")) as f:
+            keys = json.load(f)["gestures"]
+
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+        positions = {g: i for i, g in enumerate(keys)}
+        labels = np.array([positions[g] for g in np.load(os.path.join(path, "labels.npy")).tolist()], dtype=np.int64)
+        scale_file = os.path.join(path, "scale.npy")
+
+        return cls(np.load(os.path.join(path, "samples.npy"), mmap_mode='r'), offsets[:-1], np.diff(offsets), labels, keys,
+                   scale=np.load(scale_file) if os.path.exists(scale_file) else None,
+                   columns=np.load(os.path.join(path, "channels.npy"), mmap_mode='r'), path=path)
+
+    def __reduce__(self):
+        if self.path is None:
+            return GestureDataset, (self.buffer, self.offsets, self.lengths, self.labels, self.gestures, self.channels,
+                                    self.scale)
+        # processes receiving a mapped dataset map the same files instead of copying the arrays
+        return GestureDataset._remap, (self.path, self.offsets, self.lengths, self.labels, self.gestures, self.channels)
+
+    @staticmethod
+    def _remap(path, offsets, lengths, labels, gestures, channels):
+        dataset = GestureDataset.open(path)
+        return GestureDataset(dataset.buffer, offsets, lengths, labels, gestures, channels, dataset.scale,
+                              dataset.columns, path)
+
+    def _view(self, offsets, lengths, labels, gestures, channels):
+        return GestureDataset(self.buffer, offsets, lengths, labels, gestures, channels, self.scale, self.columns,
+                              self.path)
+
+    @property
+    def n_channels(self):
+        return self.buffer.shape[1] if self.channels is None else len(np.arange(self.buffer.shape[1])[self.channels])
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + (self.columns.nbytes if self.columns is not None else 0)
+
+    def keys(self):
+        return list(self.gestures)
+
+    def __len__(self):
+        return len(self.gestures)
+
+    def __iter__(self):
+        return iter(self.gestures)
+
+    def __contains__(self, gesture):
+        return gesture in self.gestures
+
+    def __getitem__(self, gesture):
+        if gesture not in self.gestures:
+            raise KeyError(gesture)
+        return [self.trial(i) for i in np.flatnonzero(self.labels == self.gestures.index(gesture))]
+
+    def values(self):
+        return [self[g] for g in self.gestures]
+
+    def items(self):
+        return [(g, self[g]) for g in self.gestures]
+
+    def trial(self, i):
+        """Samples of trial i as a (samples, channels) array."""
+        a, b = self.offsets[i], self.offsets[i] + self.lengths[i]
+        if self.channels is None:
+            sample = self.buffer[a:b]
+        elif self.columns is not None:
+            sample = self.columns[self.channels, a:b].T
+        else:
+            sample = self.buffer[a:b, self.channels]
+        if self.scale is not None:
+            sample = np.multiply(sample, self.channel_scale(), dtype=np.float32)
+        return sample
+
+    def channel_scale(self):
+        return self.scale if self.channels is None else self.scale[self.channels]
+
+    def select(self, gestures, channels=None, relabel=None):
+        """
+        Keep the trials of gestures, in the order of the dataset, restricted to a channel index
+        relative to the current channels; relabel optionally renames the kept gestures.
+        """
+        kept = [g for g in self.gestures if g in gestures]
+        positions = np.array([self.gestures.index(g) for g in kept], dtype=np.int64)
+        trials = np.flatnonzero(np.isin(self.labels, positions))
+
+        if channels is not None and self.channels is not None:
+            channels = channel_index(np.arange(self.buffer.shape[1])[self.channels][channels])
+        elif channels is None:
+            channels = self.channels
+
+        return self._view(self.offsets[trials], self.lengths[trials], np.searchsorted(positions, self.labels[trials]),
+                          kept if relabel is None else relabel, channels)
+
+    def crop(self, segments):
+        """Restrict every trial to its (start, end) segment, e.g. from segment_gestures; no samples are copied."""
+        segments = np.asarray(segments, dtype=np.int64).reshape(-1, 2)
+        return self._view(self.offsets + segments[:, 0], segments[:, 1] - segments[:, 0], self.labels, self.gestures,
+                          self.channels)
+
+    def pack(self, channels=None, dtype=np.float64, ufunc=None):
+        """pack_samples of the dataset; a contiguous selection is converted in one call instead of trial by trial."""
+        index = self.channels
+        if channels is not None:
+            index = channels if index is None else np.arange(self.buffer.shape[1])[index][channels]
+
+        ends = self.offsets + self.lengths
+        contiguous = np.array_equal(self.offsets[1:], ends[:-1])
+        first, last = (self.offsets[0], ends[-1]) if len(ends) else (0, 0)
+
+        if index is not None and self.columns is not None:
+            # only the selected channels of the channel-major copy are read
+            if contiguous:
+                rows = self.columns[index, first:last].T
+            else:
+                rows = np.concatenate([self.columns[index, a:b].T for a, b in zip(self.offsets, ends)])
+        else:
+            if contiguous:
+                rows = self.buffer[first:last]
+            else:
+                rows = np.concatenate([self.buffer[a:b] for a, b in zip(self.offsets, ends)])
+            if index is not None:
+                rows = rows[:, index]
+
+        buffer = np.empty(rows.shape, dtype=dtype)
+        if self.scale is not None:
+            # scaled like trial() does, in float32
+            np.multiply(rows, self.scale if index is None else self.scale[index], out=buffer, dtype=np.float32)
+        else:
+            buffer[...] = rows
+        if ufunc is not None:
+            ufunc(buffer, out=buffer)
+
+        offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        labels = np.array(self.gestures)[self.labels]
+
+        return buffer, offsets, labels
+
+COLUMNAR_SUFFIX = ".emg"
 
+def columnar_path(filename):
+    return os.path.splitext(filename)[0] + COLUMNAR_SUFFIX
+
+def convert_to_columnar(gestures, path, dtype=DATASET_DTYPE, source_digest=None):
+    """
+    Write a gesture dict to the memory-mapped columnar layout read by GestureDataset.open.
+
+    Samples are stored as dtype, None keeps the dtype of the trials. The dataset is
+    written to a temporary directory next to path and moved into place once complete,
+    so readers never see a partially written dataset. source_digest, the hash of the file
+    the gestures were read from, is recorded so the copy keeps identifying as that file.
+    """
+    keys = list(gestures.keys())
+    trials = [(g, np.asarray(sample)) for g in keys for sample in gestures[g]]
+
+    n_channels = trials[0][1].shape[1]
+    dtype = np.result_type(*[sample.dtype for _, sample in trials]) if dtype is None else np.dtype(dtype)
+    scale = quantization_scale([sample for _, sample in trials]) if dtype.kind == "i" else None
+
+    lengths = np.array([len(sample) for _, sample in trials], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    labels = np.array([g for g, _ in trials], dtype=np.int64)
+
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    samples = np.lib.format.open_memmap(os.path.join(tmp_path, "samples.npy"), mode='w+',
+                                        dtype=dtype, shape=(int(offsets[-1]), n_channels))
+    channel_major = np.lib.format.open_memmap(os.path.join(tmp_path, "channels.npy"), mode='w+',
+                                              dtype=dtype, shape=(n_channels, int(offsets[-1])))
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(g) for g in keys]).encode())
+    digest.update(offsets.tobytes())
+    digest.update(labels.tobytes())
+
+    for (_, sample), a, b in zip(trials, offsets[:-1], offsets[1:]):
+        sample = store_samples(sample, dtype, scale)
+        samples[a:b] = sample
+        channel_major[:, a:b] = sample.T
+        digest.update(np.ascontiguousarray(sample).tobytes())
+
+    samples.flush()
+    channel_major.flush()
+    del samples, channel_major
+
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_path, "labels.npy"), labels)
+    if scale is not None:
+        np.save(os.path.join(tmp_path, "scale.npy"), scale)
+        digest.update(scale.tobytes())
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({
+            "gestures": [int(g) for g in keys],
+            "n_channels": int(n_channels),
+            "dtype": dtype.str,
+            "digest": digest.hexdigest(),
+            **({"source_digest": source_digest} if source_digest else {}),
+        }, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+    return path
+
+def convert_pickle_to_columnar(filename):
+    """Convert a pickled gesture dataset into the columnar layout stored next to it."""
+    return convert_to_columnar(load_gestures(filename), columnar_path(filename), source_digest=file_digest(filename))
+
+def dataset_signature(filename):
+    if os.path.isdir(filename):
+        filename = os.path.join(filename, "meta.json")
+    stat = os.stat(filename)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def dataset_digest(filename):
+    """
+    Content hash of a dataset file or columnar directory.
+
+    A columnar copy of a pickle hashes like the pickle, so converting an upload does not
+    change the keys of its training results, models and preprocessed copies.
+    """
+    if os.path.isdir(filename):
+        with open(os.path.join(filename, "meta.json")) as f:
+            meta = json.load(f)
+        return meta.get("source_digest", meta["digest"])
+    return file_digest(filename)
+
+def dataset_path(ds_number, ds_filename):
+    """Locate a dataset, preferring the columnar layout over the legacy pickle."""
     if ds_number == 0 and ds_filename:
         filename = os.path.join(UPLOAD_DIR, ds_filename)
     else:
         filename = f'static/datasets/ds{ds_number}_gestures.pkl'
-    
-    with open(filename, 'rb') as f:
-        gestures = pickle.load(f)
 
-    keys = list(gestures.keys())
+    if os.path.isdir(columnar_path(filename)):
+        return columnar_path(filename)
+    return filename
+
+def channel_index(channels):
+    """
+    Convert a list of channel indices into an index for the channel axis.
+
+    Evenly spaced ascending channels are turned into a slice so that indexing a
+    sample returns a view instead of a copy.
+    """
+    channels = np.asarray(channels, dtype=int)
 
-    if len(selected_gestures):
-        for g in keys:
-            if g != 0 and g not in selected_gestures:
-                del gestures[g]
+    if len(channels) == 1:
+        return slice(channels[0], channels[0] + 1)
+
+    steps = np.diff(channels)
+    if len(channels) and steps[0] > 0 and np.all(steps == steps[0]):
+        return slice(channels[0], channels[-1] + 1, steps[0])
+
+    return channels
+
+def select_data(dataset, selected_gestures, channels):
+    """
+    Keep rest and the selected gestures of a GestureDataset, relabel them 0..n-1 and restrict them
+    to channels; no samples are copied.
+    """
+    keys = [g for g in dataset.keys() if g == 0 or not len(selected_gestures) or g in selected_gestures]
 
     class_map = {
-        v: i for i, v in enumerate(gestures.keys())
+        v: i for i, v in enumerate(keys)
     }
 
-    gestures_mapped = {}
+    index = channel_index(channels) if len(channels) else None
 
-    for g in gestures.keys():
-        gestures_mapped[class_map[g]] = gestures[g]
+    return dataset.select(keys, index, [class_map[g] for g in keys]), class_map
 
-    if len(channels):
-        gestures_mapped = {g: [sample[:, channels] for sample in gestures_mapped[g]] for g in gestures_mapped.keys()}
+def get_data(ds_number, selected_gestures, channels, ds_filename):
+    dataset = dataset_cache.get(dataset_path(ds_number, ds_filename))
 
-    return gestures_mapped, class_map
+    return select_data(dataset, selected_gestures, channels)
 
 def calculate_rms(window):
     """
@@ -102,45 +798,317 @@ def calculate_rms(window):
 
     return rms_per_channel, rms_avg
 
-def calculate_features(gestures, channels=None):
-    features = []
+def pack_samples(gestures, channels=None, dtype=np.float64, ufunc=None):
+    """
+    Concatenate all trials into one contiguous buffer.
+
+    Parameters:
+    - gestures: dict mapping gesture labels to lists of (samples, channels) arrays.
+    - channels: optional index of the channels to keep.
+    - ufunc: optional elementwise NumPy ufunc applied to the trials while packing them.
+
+    Returns:
+    - buffer: NumPy array of shape (total_samples, num_channels) holding every trial back to back.
+    - offsets: NumPy array of shape (num_trials + 1,), trial i spans buffer[offsets[i]:offsets[i + 1]].
+    - labels: NumPy array of shape (num_trials,), the gesture of each trial.
+    """
+    if isinstance(gestures, GestureDataset):
+        return gestures.pack(channels, dtype, ufunc)
+
+    trials = []
     labels = []
 
     for g in gestures.keys():
-
         for sample in gestures[g]:
-            feature_set = []
-            window_len = (len(sample) // 3)
-            if channels is None:
-                windows = [sample[window_len * i:window_len * (i + 1)] for i in range(3)]
-            else:
-                windows = [sample[window_len * i:window_len * (i + 1), channels] for i in range(3)]
-            for w in windows:
-                rms_per_channel, rms_avg = calculate_rms(w)
-                rms_per_channel = rms_per_channel / rms_avg
-                feature_set.extend(rms_per_channel)
-            features.append(feature_set)
+            trials.append(sample if channels is None else sample[:, channels])
             labels.append(g)
 
-    features = np.array(features)
-    labels = np.array(labels)
+    lengths = np.array([len(trial) for trial in trials], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    buffer = np.empty((offsets[-1], trials[0].shape[1]), dtype=dtype)
+
+    for trial, a, b in zip(trials, offsets[:-1], offsets[1:]):
+        buffer[a:b] = trial
+        if ufunc is not None:
+            # applied in the buffer dtype, not in the possibly narrower dtype of the trial
+            ufunc(buffer[a:b], out=buffer[a:b])
+
+    return buffer, offsets, np.array(labels)
+
+def window_matrix(starts, lengths, n_samples):
+    """
+    Sparse (num_windows, n_samples) indicator matrix of windows of a packed buffer.
+
+    Window i covers buffer[starts[i]:starts[i] + lengths[i]]; multiplying the matrix with
+    the buffer sums every window in a single pass.
+    """
+    rows = np.repeat(np.arange(len(starts)), lengths)
+    cols = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    return csr_matrix((np.ones(len(cols)), (rows, cols)), shape=(len(starts), n_samples))
+
+def calculate_window_rms(gestures, channels=None, n_windows=3):
+    """
+    Calculate the RMS value of every channel in n_windows equal windows of every trial.
+
+    Trailing samples that do not fill a whole window are ignored.
+
+    Returns:
+    - rms: NumPy array of shape (num_trials, n_windows, num_channels).
+    - labels: NumPy array of shape (num_trials,).
+    """
+    squared, offsets, labels = pack_samples(gestures, channels, ufunc=np.square)
+
+    window_len = (offsets[1:] - offsets[:-1]) // n_windows
+    starts = (offsets[:-1, None] + window_len[:, None] * np.arange(n_windows)).ravel()
+    windows = window_matrix(starts, np.repeat(window_len, n_windows), len(squared))
+
+    sums = (windows @ squared).reshape(len(labels), n_windows, -1)
+
+    rms = np.sqrt(sums / window_len[:, None, None])
+
+    return rms, labels
+
+def normalize_window_rms(rms):
+    """
+    Normalize windowed RMS values by the average RMS across channels of each window.
+
+    Returns a feature matrix of shape (num_trials, n_windows * num_channels), window-major.
+    """
+    rms = rms / rms.mean(axis=2, keepdims=True)
+    return rms.reshape(len(rms), -1)
+
+FEATURE_CACHE_BYTES = int(os.environ.get("SPARSEEMG_FEATURE_CACHE_BYTES", 256 * 1024 ** 2))
+
+class FeatureCache:
+    """
+    Process-wide LRU cache of windowed RMS values computed over all channels of a dataset.
+
+    Entries are keyed by the caller (dataset digest, selected gestures, channels, preprocessing)
+    together with the window count, and bounded by the total size of the cached arrays.
+    Feature matrices for channel subsets are derived from an entry by slicing channels.
+    """
+
+    def __init__(self, max_bytes=FEATURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, gestures, n_windows=3):
+        """Return (rms, labels) for all channels of gestures, computing them on a miss."""
+        key = (key, n_windows)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        rms, labels = calculate_window_rms(gestures, None, n_windows)
+        rms.flags.writeable = False
+
+        with self._lock:
+            self.misses += 1
+
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[0].nbytes
+
+            self._entries[key] = (rms, labels)
+            self.nbytes += rms.nbytes
+
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+        return rms, labels
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+feature_cache = FeatureCache()
+
+def calculate_features(gestures, channels=None, n_windows=3, cache_key=None):
+    """
+    Calculate the normalized windowed RMS feature matrix of gestures.
+
+    If cache_key identifies the gesture data, the raw RMS values of all channels are taken
+    from the feature cache and only the selected channels are normalized.
+    """
+    if cache_key is None:
+        rms, labels = calculate_window_rms(gestures, channels, n_windows)
+    else:
+        rms, labels = feature_cache.get(cache_key, gestures, n_windows)
+        if channels is not None:
+            rms = rms[:, :, channels]
+
+    features = normalize_window_rms(rms)
 
     return features, labels
 
-def get_classifier(model_name):
-    if model_name == "SVC":
-        model = SVC()
-    elif model_name == "Logistic Regression": 
-        model = LogisticRegression(max_iter=5000)
-    elif model_name == "KNN":
-        model = KNeighborsClassifier()
-    elif model_name == "Naive Bayes": 
-        model = GaussianNB()
-    elif model_name == "XGB": 
-        model = xgb.XGBClassifier(random_state=42)
+class Plugin:
+    """A registered classifier or ranking metric; modules lists the heavy imports it needs, for preloading."""
+
+    def __init__(self, name, fn, modules=(), **info):
+        self.name = name
+        self.fn = fn
+        self.modules = tuple(modules)
+        self.info = info
+
+class PluginRegistry:
+    """
+    Named plugins of one kind, looked up by name or alias.
+
+    Plugin functions import their heavy dependencies themselves, so nothing is imported
+    until a plugin is first used or preloaded. Unknown names resolve to the default plugin.
+    """
+
+    def __init__(self, kind, default):
+        self.kind = kind
+        self.default = default
+        self.plugins = OrderedDict()
+        self.aliases = {}
+
+    def register(self, name, modules=(), aliases=(), **info):
+        def decorator(fn):
+            self.plugins[name] = Plugin(name, fn, modules, **info)
+            for alias in aliases:
+                self.aliases[alias] = name
+            return fn
+        return decorator
+
+    def resolve(self, name):
+        """Canonical name of a plugin name or alias, the default for unknown names."""
+        name = self.aliases.get(name, name)
+        return name if name in self.plugins else self.default
+
+    def __contains__(self, name):
+        return name in self.plugins or name in self.aliases
+
+    def plugin(self, name):
+        return self.plugins[self.resolve(name)]
+
+    def preload(self, name):
+        for module in self.plugin(name).modules:
+            importlib.import_module(module)
+
+classifiers = PluginRegistry("classifier", default="Random Forest")
+
+@classifiers.register("Random Forest", modules=("sklearn.ensemble",), aliases=("random_forest",), explainer="tree")
+def random_forest(n_jobs=None):
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(max_depth=30, random_state=42)
+
+@classifiers.register("SVC", modules=("sklearn.svm",), aliases=("support_vector_classifier",))
+def svc(n_jobs=None):
+    from sklearn.svm import SVC
+    return SVC()
+
+@classifiers.register("Logistic Regression", modules=("sklearn.linear_model",), aliases=("logistic_regression",),
+                      explainer="linear")
+def logistic_regression(n_jobs=None):
+    from sklearn.linear_model import LogisticRegression
+    return LogisticRegression(max_iter=5000)
+
+@classifiers.register("KNN", modules=("sklearn.neighbors",), aliases=("k_nearest_neighbors",))
+def knn(n_jobs=None):
+    from sklearn.neighbors import KNeighborsClassifier
+    return KNeighborsClassifier()
+
+@classifiers.register("Naive Bayes", modules=("sklearn.naive_bayes",), aliases=("naive_bayes",))
+def naive_bayes(n_jobs=None):
+    from sklearn.naive_bayes import GaussianNB
+    return GaussianNB()
+
+@classifiers.register("XGB", modules=("xgboost",), aliases=("xgboost",), explainer="tree")
+def xgboost_classifier(n_jobs=None):
+    import xgboost as xgb
+    return xgb.XGBClassifier(random_state=42, n_jobs=n_jobs)
+
+def get_classifier(model_name, n_jobs=None):
+    return classifiers.plugin(model_name).fn(n_jobs=n_jobs)
+
+def is_xgboost_model(model):
+    # checked by module, so xgboost is not imported just to tell
+    return type(model).__module__.split(".")[0] == "xgboost"
+
+TRAIN_WORKERS = int(os.environ.get("SPARSEEMG_TRAIN_WORKERS", os.cpu_count() or 1))
+
+_sweep_pool = None
+_sweep_pool_workers = 0
+_sweep_pool_lock = threading.Lock()
+
+def init_sweep_worker():
+    """Limit each pool process to one BLAS/OpenMP thread, parallelism comes from the pool."""
+    threadpool_limits(1)
+
+def get_sweep_pool(n_workers):
+    """Return the shared process pool for CV tasks, (re)creating it with n_workers processes."""
+    global _sweep_pool, _sweep_pool_workers
+
+    with _sweep_pool_lock:
+        if _sweep_pool is None or _sweep_pool_workers != n_workers:
+            if _sweep_pool is not None:
+                _sweep_pool.shutdown(wait=False)
+            _sweep_pool = ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_sweep_worker,
+            )
+            _sweep_pool_workers = n_workers
+
+    return _sweep_pool
+
+def terminate_sweep_pool():
+    """Kill the processes of the sweep pool, failing the tasks they run; the next run_tasks starts a new pool."""
+    global _sweep_pool, _sweep_pool_workers
+
+    with _sweep_pool_lock:
+        pool, _sweep_pool, _sweep_pool_workers = _sweep_pool, None, 0
+
+    if pool is None:
+        return 0
+
+    # the executor has no public way to stop running tasks before Python 3.14
+    processes = list(pool._processes.values()) if pool._processes else []
+    for process in processes:
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    metrics.inc("sparseemg_terminated_workers_total", len(processes))
+    return len(processes)
+
+def run_tasks(fn, tasks, n_workers=TRAIN_WORKERS):
+    """
+    Run fn over a list of argument tuples, in the sweep pool if more than one worker is allowed.
+
+    Returns an iterator over the results in task order, which yields each result as soon as it is available.
+    Closing the iterator early cancels the tasks that have not started.
+    """
+    if n_workers <= 1 or len(tasks) <= 1:
+        results = (fn(*task) for task in tasks)
     else:
-        model = RandomForestClassifier(max_depth=30, random_state=42)
-    return model
+        # batch small tasks so inter-process overhead does not dominate
+        chunksize = max(1, len(tasks) // (n_workers * 4))
+        results = get_sweep_pool(n_workers).map(fn, *zip(*tasks), chunksize=chunksize)
+
+    def consume():
+        used = 0
+        try:
+            for result in results:
+                used += 1
+                yield result
+        finally:
+            results.close()
+            if used < len(tasks):
+                metrics.inc("sparseemg_abandoned_tasks_total", len(tasks) - used)
+
+    return consume()
 
 def baseline_normalization_arv(gesture_signal, rest_mean_global, rest_arv_global):
     """Normalize the gesture signal using ARV of the rest signal."""
@@ -156,237 +1124,395 @@ def compute_max_abs(signal):
     return np.max(np.abs(signal), axis=0)
 
 def aggregate_rest_signals(rest_signals):
-    """Aggregate multiple rest signals by computing their mean, RMS, ARV, and Max-Abs."""
-    rest_means = np.array([np.mean(rest, axis=0) for rest in rest_signals])  # Mean per rest trial
-    rest_arv = np.array([compute_arv(rest) for rest in rest_signals])  # ARV per rest trial
-    
+    """Aggregate multiple rest signals by averaging their per-trial mean and ARV."""
+    buffer, offsets, _ = pack_samples({0: rest_signals})
+    lengths = offsets[1:] - offsets[:-1]
+    trials = window_matrix(offsets[:-1], lengths, len(buffer))
+
+    rest_means = (trials @ buffer) / lengths[:, None]  # Mean per rest trial
+    rest_arv = (trials @ np.abs(buffer, out=buffer)) / lengths[:, None]  # ARV per rest trial
+
     # Compute global rest statistics
     rest_mean_global = np.mean(rest_means, axis=0)  # Global mean
     rest_arv_global = np.mean(rest_arv, axis=0)  # ARV over all rest trials
-    
+
     return rest_mean_global, rest_arv_global
 
-def find_intersection_with_indices(arrays, threshold=1.0):
+def consensus_ranking(rankings):
     """
-    Finds the intersection of arrays and returns the intersected items 
-    with their indices in each array based on a threshold.
+    Order channels by the position they hold most often across several rankings.
 
-    Args:
-        arrays (list of np.ndarray): A list of numpy arrays.
-        threshold (float): A value between 0 and 1 representing the minimum 
-                           percentage of arrays that must contain an item 
-                           for it to be included in the result.
+    Parameters:
+    - rankings: NumPy array of shape (num_rankings, num_channels), every row a permutation of the channels.
 
     Returns:
-        list: A list of tuples where each tuple contains an intersected item
-              and its indices in each array.
+    - NumPy array of the channels sorted by their most frequent position. A tie between positions
+      goes to the one met first in ranking order, a tie between channels to the lower channel.
     """
+    num_rankings, num_channels = rankings.shape
+    owners = np.arange(num_channels)
 
-    num_arrays = len(arrays)
-    min_occurrences = int(threshold * num_arrays)
+    # positions[r, ch] is the index of channel ch in ranking r
+    positions = np.empty_like(rankings)
+    positions[np.arange(num_rankings)[:, None], rankings] = owners
 
-    # Find all items and their occurrences across arrays
-    item_occurrences = {}
-    for i, array in enumerate(arrays):
-        unique_items = np.unique(array)
-        for item in unique_items:
-            if item not in item_occurrences:
-                item_occurrences[item] = []
-            item_occurrences[item].append(i)
+    # votes[ch, p] counts the rankings putting ch at position p, first[ch, p] is the first of them
+    cells = (owners * num_channels + positions).ravel()
+    votes = np.bincount(cells, minlength=num_channels ** 2).reshape(num_channels, num_channels)
+    first = np.full(num_channels ** 2, num_rankings)
+    np.minimum.at(first, cells, np.repeat(np.arange(num_rankings), num_channels))
+    first = first.reshape(num_channels, num_channels)
 
-    # Filter items based on the threshold
-    filtered_items = {item: indices for item, indices in item_occurrences.items() if len(indices) >= min_occurrences}
+    most_voted = votes == votes.max(axis=1, keepdims=True)
+    position = np.argmin(np.where(most_voted, first, num_rankings), axis=1)
 
-    # Collect indices of filtered items
-    result = []
-    for item, array_indices in filtered_items.items():
-        indices = []
-        for i in array_indices:
-            indices.append(np.where(arrays[i] == item)[0][0])
-        result.append((item, indices))
+    return np.argsort(position, kind="stable")
 
-    return result
+def trial_moments(gestures):
+    """
+    Per-channel sum and sum of squares of every trial, read in one pass without temporaries.
 
-def find_intersection(arrays, threshold=1.0):
+    Returns:
+    - sums: NumPy array of shape (num_trials, num_channels).
+    - squares: NumPy array of shape (num_trials, num_channels).
+    - lengths: NumPy array of shape (num_trials,), the samples of each trial.
+    - labels: NumPy array of shape (num_trials,), the gesture of each trial.
     """
-    Finds the intersection of arrays based on a threshold.
+    trials = [(g, sample) for g in gestures.keys() for sample in gestures[g]]
 
-    Args:
-        arrays (list of np.ndarray): A list of numpy arrays.
-        threshold (float): A value between 0 and 1 representing the minimum 
-                           percentage of arrays that must contain an item 
-                           for it to be included in the result.
+    sums = np.array([sample.sum(axis=0, dtype=np.float64) for _, sample in trials])
+    squares = np.array([np.einsum("ij,ij->j", sample, sample, dtype=np.float64) for _, sample in trials])
+    lengths = np.array([len(sample) for _, sample in trials])
 
-    Returns:
-        list: A list of intersected items.
+    return sums, squares, lengths, np.array([g for g, _ in trials])
+
+def calculate_rms_rankings(gestures):
     """
-    # if not arrays or len(arrays) < 2:
-        # return []  # No intersection possible
+    Rank channels by their RMS after normalizing every trial to the rest baseline.
+
+    Every gesture ranks the channels by their RMS averaged over its trials, the rankings are
+    merged with consensus_ranking. The normalized RMS of all trials follows from their raw
+    moments, mean((x - m)^2) = mean(x^2) - 2 m mean(x) + m^2, so no normalized copy is made.
+    """
+    rest_mean_global, rest_arv_global = aggregate_rest_signals(gestures[0])
+
+    sums, squares, lengths, labels = trial_moments(gestures)
+
+    centered = squares - 2 * rest_mean_global * sums + lengths[:, None] * rest_mean_global ** 2
+    # cancellation can leave tiny negative values on flat channels
+    mean_square = np.maximum(centered, 0) / lengths[:, None] / (rest_arv_global + 1e-8) ** 2
+    rms = np.sqrt(mean_square)
+
+    # trials come gesture after gesture, average the RMS of each run of trials
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    mean_rms = np.add.reduceat(rms, starts, axis=0) / np.diff(np.r_[starts, len(labels)])[:, None]
+
+    return list(consensus_ranking(np.argsort(mean_rms, axis=1)))
+
+def calculate_tmi_rankings(gestures, cache_key=None):
+    from sklearn.feature_selection import mutual_info_classif
 
-    num_arrays = len(arrays)
-    min_occurrences = int(threshold * num_arrays)
+    n_channels = gestures[0][0].shape[1]
+
+    features, labels = calculate_features(gestures, cache_key=cache_key)
+
+    multivariate_tmi = mutual_info_classif(features, labels)
+
+    components_per_channel = np.array([multivariate_tmi[ch::n_channels] for ch in range(n_channels)])
+
+    channel_importance = components_per_channel.sum(axis=1)
 
-    # Find all items and their occurrences across arrays
-    item_occurrences = {}
-    for i, array in enumerate(arrays):
-        unique_items = np.unique(array)
-        for item in unique_items:
-            if item not in item_occurrences:
-                item_occurrences[item] = []
-            item_occurrences[item].append(i)
+    ranked_channels = np.argsort(channel_importance)
 
-    # Filter items based on the threshold
-    filtered_items = [item for item, indices in item_occurrences.items() if len(indices) >= min_occurrences]
+    return ranked_channels
 
-    return filtered_items
+PI_REPEATS = 5
+PI_MIN_REPEATS = 2
+PI_TOLERANCE = 0.005
 
-def arrange_by_max_occurrence(intersection_with_indices):
+def grouped_permutation_importance(model, X, y, groups, n_repeats=PI_REPEATS, min_repeats=PI_MIN_REPEATS,
+                                   tol=PI_TOLERANCE, random_state=42):
     """
-    Arranges intersected items based on their most frequent index across arrays.
+    Permutation importance of groups of columns, each group shuffled with one shared row permutation.
 
-    Args:
-        intersection_with_indices (list): Output of find_intersection_with_indices.
+    Parameters:
+    - groups: list of column indices, one entry per group.
+    - min_repeats, tol: a group is not permuted again once it has min_repeats accuracy drops
+      and the standard error of their mean is below tol.
 
     Returns:
-        list: A list of items arranged relative to their most frequent index.
-    """
-    # Create a dictionary to store items and their most frequent index
-    frequency_dict = {}
-    for item, indices in intersection_with_indices:
-        # Count occurrences of each index
-        index_counts = {}
-        for idx in indices:
-            index_counts[idx] = index_counts.get(idx, 0) + 1
-        # Find the index with the maximum occurrences
-        max_index = max(index_counts, key=index_counts.get)
-        frequency_dict[item] = max_index
-
-    # Sort items based on their most frequent index
-    sorted_items = sorted(frequency_dict.items(), key=lambda x: x[1])
-
-    # Extract the sorted items
-    result = [item for item, _ in sorted_items]
-    return result
-
-def calculate_rms_rankings(gestures):
+    - importances: NumPy array of shape (num_groups,), mean accuracy drop of every group.
+    """
+    from sklearn.metrics import accuracy_score
 
-    rest_mean_global, rest_arv_global = aggregate_rest_signals(gestures[0])
+    rng = np.random.RandomState(random_state)
 
-    ranked_channels = {}
+    baseline = accuracy_score(y, model.predict(X))
 
-    for g in gestures.keys():
-        gestures_cleaned = []
-        for gesture_signal in gestures[g]:
-            cleaned_signal = baseline_normalization_arv(gesture_signal, rest_mean_global, rest_arv_global)
-            gestures_cleaned.append(cleaned_signal)
+    # one working copy, each group is restored after it has been permuted
+    X_permuted = X.copy()
+    importances = np.zeros(len(groups))
 
-        ranked_channels[g] = np.array([
-            np.sqrt(np.mean(np.square(sample), axis=0)) for sample in gestures_cleaned
-        ]).mean(axis=0)
+    for i, columns in enumerate(groups):
+        drops = []
 
-        ranked_channels[g] = np.argsort(ranked_channels[g])
+        for repeat in range(n_repeats):
+            X_permuted[:, columns] = X[np.ix_(rng.permutation(len(X)), columns)]
+            drops.append(baseline - accuracy_score(y, model.predict(X_permuted)))
 
-    ranked_channels = arrange_by_max_occurrence(find_intersection_with_indices(np.array(
-        [ranked_channels[a] for a in gestures.keys()]
-    )))
+            if repeat + 1 >= min_repeats and np.std(drops, ddof=1) / np.sqrt(len(drops)) < tol:
+                break
 
-    return ranked_channels
+        X_permuted[:, columns] = X[:, columns]
+        importances[i] = np.mean(drops)
 
-def calculate_tmi_rankings(gestures):
+    return importances
 
-    n_channels = gestures[0][0].shape[1]
+def pi_fold_importance(model_name, X_train, y_train, X_val, y_val, n_channels, grouped=True, n_repeats=PI_REPEATS):
+    """Fit the classifier on one CV split and return the permutation importance of every channel on the held-out part."""
+    model = get_classifier(model_name, n_jobs=1)
+    model.fit(X_train, y_train)
 
-    features, labels = calculate_features(gestures)
+    if grouped:
+        groups = [np.arange(ch, X_val.shape[1], n_channels) for ch in range(n_channels)]
+        return grouped_permutation_importance(model, X_val, y_val, groups, n_repeats=n_repeats)
 
-    multivariate_tmi = mutual_info_classif(features, labels)
+    from sklearn.inspection import permutation_importance
 
-    components_per_channel = np.array([multivariate_tmi[ch::n_channels] for ch in range(n_channels)])
+    result = permutation_importance(model, X_val, y_val, n_repeats=n_repeats, random_state=42)
 
-    channel_importance = components_per_channel.sum(axis=1)
+    # Sum across window features for each channel
+    return result.importances_mean.reshape(-1, n_channels).sum(axis=0)
 
-    ranked_channels = np.argsort(channel_importance)
+def calculate_pi_rankings(model_name, gestures, cache_key=None, grouped=True, n_repeats=PI_REPEATS, n_workers=TRAIN_WORKERS):
+    """
+    Rank channels by permutation importance over 4 CV folds, evaluated in parallel.
 
-    return ranked_channels
+    With grouped, all window features of a channel are permuted together, which needs one
+    evaluation per channel instead of one per feature; otherwise every feature is permuted
+    on its own and the importances of a channel's features are summed.
+    """
+    from sklearn.model_selection import StratifiedKFold
 
-def calculate_pi_rankings(model_name, gestures):
-     
     n_channels = gestures[0][0].shape[1]
 
-    features, labels = calculate_features(gestures)
+    features, labels = calculate_features(gestures, cache_key=cache_key)
 
     skf = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
 
-    model = get_classifier(model_name)
-
-    importances = []
+    tasks = []
 
     for train_index, val_index in skf.split(features, labels):
         X_train, X_val = features[train_index], features[val_index]
         y_train, y_val = labels[train_index], labels[val_index]
 
-        # Train the model
-        model.fit(X_train, y_train)
-        
-        # Compute permutation importance on the validation set
-        result = permutation_importance(model, X_val, y_val, random_state=42)
-        
-        # Store the importance values for this fold
-        importances.append(result.importances_mean)
-
-    importances = np.mean(importances, axis=0)
-
-    components_per_channel = np.array([importances[ch::n_channels] for ch in range(n_channels)])
+        tasks.append((model_name, X_train, y_train, X_val, y_val, n_channels, grouped, n_repeats))
 
-    # Sum across features for each channel
-    channel_importance = components_per_channel.sum(axis=1)  # Shape: (n_components, num_channels)
+    channel_importance = np.mean(list(run_tasks(pi_fold_importance, tasks, n_workers)), axis=0)
 
     ranked_channels = np.argsort(channel_importance)
 
     return ranked_channels
 
-def calculate_shap_rankings(model_name, gestures): 
+SHAP_BACKGROUND_SIZE = 50
+SHAP_NSAMPLES = 512
+SHAP_MAX_EXPLAINED = 64
+
+def shap_explainer_kind(model_name):
+    """The cheapest exact SHAP explainer of a classifier (tree or linear), kernel otherwise."""
+    return classifiers.plugin(model_name).info.get("explainer", "kernel")
+
+def shap_fold_importance(model_name, X_train, y_train, X_val, n_channels, explainer="auto",
+                         background_size=SHAP_BACKGROUND_SIZE, nsamples=SHAP_NSAMPLES, max_explained=SHAP_MAX_EXPLAINED):
+    """
+    Fit the classifier on one CV split and return the mean absolute SHAP value of every channel on the held-out part.
+
+    Tree and linear models are explained exactly. Other models use KernelExplainer with a
+    k-means background of background_size points, nsamples model evaluations per explained
+    sample and at most max_explained randomly chosen held-out samples (None for all).
+    """
+    import shap
+
+    model = get_classifier(model_name, n_jobs=1)
+    model.fit(X_train, y_train)
+
+    if explainer == "auto":
+        explainer = shap_explainer_kind(model_name)
+
+    if explainer == "tree":
+        shap_values = shap.TreeExplainer(model).shap_values(X_val, check_additivity=False)
+    elif explainer == "linear":
+        shap_values = shap.LinearExplainer(model, X_train).shap_values(X_val)
+    else:
+        if max_explained is not None and len(X_val) > max_explained:
+            X_val = X_val[np.random.RandomState(42).choice(len(X_val), max_explained, replace=False)]
+
+        # SVC only has probabilities when fitted with probability=True
+        predict = model.predict_proba if hasattr(model, "predict_proba") else model.decision_function
+
+        background = shap.kmeans(X_train, min(background_size, len(X_train)))
+        shap_values = shap.KernelExplainer(predict, background).shap_values(X_val, nsamples=nsamples, silent=True)
+
+    if isinstance(shap_values, list):
+        shap_values = np.stack(shap_values, axis=-1)
+
+    shap_array = np.abs(shap_values).mean(axis=0)  # Average across samples
+    if shap_array.ndim == 2:
+        shap_array = shap_array.mean(axis=1)  # Average across classes
+
+    # Aggregate importance per channel by summing over windows
+    return shap_array.reshape(-1, n_channels).sum(axis=0)
+
+def calculate_shap_rankings(model_name, gestures, cache_key=None, explainer="auto", n_workers=TRAIN_WORKERS, **explainer_options):
+    """
+    Rank channels by their mean absolute SHAP value over 4 CV folds, explained in parallel.
+
+    explainer is "auto" (tree, linear or kernel depending on the classifier) or forces one
+    of them; explainer_options are passed on to shap_fold_importance.
+    """
+    from sklearn.model_selection import StratifiedKFold
 
     n_channels = gestures[0][0].shape[1]
 
-    features, labels = calculate_features(gestures)
+    features, labels = calculate_features(gestures, cache_key=cache_key)
 
     skf = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
 
-    model = get_classifier(model_name)
-
-    importances = []
+    tasks = []
 
     for train_index, val_index in skf.split(features, labels):
         X_train, X_val = features[train_index], features[val_index]
-        y_train, y_val = labels[train_index], labels[val_index]
+        y_train = labels[train_index]
+
+        tasks.append((model_name, X_train, y_train, X_val, n_channels, explainer))
 
-        model.fit(X_train, y_train)
+    importances = list(run_tasks(partial(shap_fold_importance, **explainer_options), tasks, n_workers))
 
-        explainer = shap.KernelExplainer(model.predict_proba, shap.kmeans(X_train, 50))
-        shap_values = explainer(X_val)
+    importances = np.mean(importances, axis=0)
 
-        shap_array = np.abs(shap_values.values).mean(axis=0)  # Average across samples
-        shap_matrix = np.array([np.mean(shap_array, axis=1)[ch::n_channels] for ch in range(n_channels)])
+    ranked_channels = np.argsort(importances)
 
-        # Aggregate importance per channel by summing over features
-        channel_importance = shap_matrix.sum(axis=1)  # Sum across all features for each channel
+    return ranked_channels
 
-        importances.append(channel_importance)
+ranking_metrics = PluginRegistry("metric", default="Permutation Importance")
 
-    importances = np.mean(importances, axis=0)
+@ranking_metrics.register("RMS", aliases=("rms",))
+def rms_metric(model_name, gestures, cache_key=None):
+    return calculate_rms_rankings(gestures)
 
-    # Rank channels by importance
-    ranked_channels = np.argsort(channel_importance)  # Sort in descending order
+@ranking_metrics.register("Mutual Information", modules=("sklearn.feature_selection",), aliases=("mutual_importance",))
+def mutual_information_metric(model_name, gestures, cache_key=None):
+    return calculate_tmi_rankings(gestures, cache_key=cache_key)
 
-    return ranked_channels
+@ranking_metrics.register("SHAP", modules=("shap",))
+def shap_metric(model_name, gestures, cache_key=None):
+    return calculate_shap_rankings(model_name, gestures, cache_key=cache_key)
+
+@ranking_metrics.register("Permutation Importance", modules=("sklearn.inspection",), aliases=("permutation_importance",))
+def permutation_importance_metric(model_name, gestures, cache_key=None):
+    return calculate_pi_rankings(model_name, gestures, cache_key=cache_key)
+
+def predict_fold(model_name, X_train, y_train, X_test):
+    """Fit a fresh classifier on one CV split and return its predictions for the held-out part."""
+    model = get_classifier(model_name, n_jobs=1)
+
+    model.fit(X_train, y_train)
+
+    return model.predict(X_test)
+
+def cross_validate_subsets(subsets, gestures, model_name, cache_key=None, n_workers=TRAIN_WORKERS, refit_final=False, progress=None,
+                           trace=None):
+    """
+    Cross-validate the classifier on every channel subset and keep the best one.
+
+    All (subset, fold) fits are independent and run in the sweep pool; every classifier is
+    seeded, so the result does not depend on the number of workers. Accuracy, macro F1
+    and the confusion matrix all come from the out-of-fold predictions of these fits, ties
+    go to the earlier subset. With refit_final the classifier is fitted once more on all
+    trials of the best subset and returned, otherwise no model is returned. progress, if
+    given, is called with keyword arguments describing each finished fold. Feature
+    extraction, cross-validation and the refit are timed as spans of trace.
+
+    Returns:
+    - best_model, best_channels, best_accuracy, best_f1, best_cm
+    """
+    from sklearn.model_selection import StratifiedKFold
+    from sklearn.metrics import accuracy_score, f1_score, confusion_matrix
 
-def train_model(electrodes_sorted, gestures, optimize_further, model_name):
+    if not len(subsets):
+        raise ValueError("no channel subsets to cross-validate")
 
     best_accuracy = 0
     best_f1 = 0
     best_model = None
     best_cm = None
 
+    skf = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
+
+    if trace is None:
+        trace = JobTrace(classifier=model_name)
+
+    candidates = []
+    tasks = []
+
+    with trace.span("features", subsets=len(subsets)) as span:
+        for selected_channels in subsets:
+
+            features, labels = calculate_features(gestures, selected_channels, cache_key=cache_key)
+
+            splits = list(skf.split(features, labels))
+
+            candidates.append((selected_channels, features, labels, splits))
+
+            for train_index, val_index in splits:
+                tasks.append((model_name, features[train_index], labels[train_index], features[val_index]))
+
+        span["features"] = sum(features.shape[1] for _, features, _, _ in candidates)
+
+    # closed early when the job is cancelled, which drops the fits that have not started
+    with trace.span("cross_validation", fits=len(tasks)), closing(run_tasks(predict_fold, tasks, n_workers)) as predictions:
+        for selected_channels, features, labels, splits in candidates:
+            y_pred = np.empty_like(labels)
+
+            accuracy = []
+            f1 = []
+
+            for fold, (_, val_index) in enumerate(splits):
+                y_pred[val_index] = next(predictions)
+
+                accuracy.append(accuracy_score(labels[val_index], y_pred[val_index]))
+                f1.append(f1_score(labels[val_index], y_pred[val_index], average="macro"))
+
+                if progress is not None:
+                    progress(stage="sweep", z=len(selected_channels), fold=fold + 1, n_folds=len(splits),
+                             best_accuracy=float(best_accuracy))
+
+            accuracy = np.mean(accuracy)
+            f1 = np.mean(f1)
+
+            if accuracy > best_accuracy:
+                best_channels = selected_channels
+                best_accuracy = accuracy
+                best_f1 = f1
+                best_cm = confusion_matrix(labels, y_pred)
+                best_features, best_labels = features, labels
+
+    if refit_final:
+        with trace.span("refit", trials=len(best_labels)):
+            best_model = get_classifier(model_name)
+            best_model.fit(best_features, best_labels)
+
+    return best_model, best_channels, best_accuracy, best_f1, best_cm
+
+def train_model(electrodes_sorted, gestures, optimize_further, model_name, cache_key=None, n_workers=TRAIN_WORKERS, refit_final=False, progress=None,
+                trace=None, sweep="exhaustive", budget=None):
+    """
+    Cross-validate the classifier on the top z ranked channels, z from 2 to 20 when optimizing, and keep the best z.
+
+    With sweep="halving" the z values are screened with halving_sweep and only the survivors
+    are cross-validated with the classifier; budget is its deadline in seconds.
+    """
+
     if optimize_further:
         l_start = 2
         l_end = min(21, len(electrodes_sorted) + 1)
@@ -394,51 +1520,226 @@ def train_model(electrodes_sorted, gestures, optimize_further, model_name):
         l_start = len(electrodes_sorted)
         l_end = len(electrodes_sorted) + 1
 
-    for z in range(l_start, l_end):
+    subsets = [electrodes_sorted[-z:] for z in range(l_start, l_end)]
 
-        print(f"Training for top {z}...")
+    if sweep == "halving" and len(subsets) > 1:
+        return halving_sweep(subsets, gestures, model_name, cache_key, budget=budget, n_workers=n_workers,
+                             refit_final=refit_final, progress=progress, trace=trace)
 
-        model = get_classifier(model_name)
+    return cross_validate_subsets(subsets, gestures, model_name, cache_key, n_workers, refit_final, progress, trace)
 
-        selected_channels = electrodes_sorted[-z:]
+SEARCH_MODES = ("prefix", "halving", "forward", "floating", "beam")
+SEARCH_PROXY = "Naive Bayes"
+SEARCH_MAX_CHANNELS = 20
+SEARCH_BEAM_WIDTH = 4
+SEARCH_FINALISTS = 5
 
-        features, labels = calculate_features(gestures, selected_channels)
+def cv_accuracy(model_name, features, labels, splits):
+    """Mean accuracy of a fresh classifier over the given CV splits."""
+    from sklearn.metrics import accuracy_score
 
-        skf = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
+    accuracy = []
+    for train_index, val_index in splits:
+        y_pred = predict_fold(model_name, features[train_index], labels[train_index], features[val_index])
+        accuracy.append(accuracy_score(labels[val_index], y_pred))
+    return float(np.mean(accuracy))
 
-        accuracy = []
-        f1 = []
+class SubsetScorer:
+    """
+    Memoized proxy CV accuracy of channel subsets.
 
-        for train_index, val_index in skf.split(features, labels):
-            X_train, X_test = features[train_index], features[val_index]
-            y_train, y_test = labels[train_index], labels[val_index]
-        
-            model.fit(X_train, y_train)
-            y_pred = model.predict(X_test)
-            
-            accuracy_cv = accuracy_score(y_test, y_pred)
-            f1_cv = f1_score(y_test, y_pred, average="macro")
-
-            accuracy.append(accuracy_cv)
-            f1.append(f1_cv)
-        
-        accuracy = np.mean(accuracy)
-        f1 = np.mean(f1)
-
-        if accuracy > best_accuracy:
-            best_model = model
-            best_channels = selected_channels
-            best_accuracy = accuracy
-            best_f1 = f1
-            y_pred = cross_val_predict(best_model, features, labels, cv=skf)
-            best_cm = confusion_matrix(labels, y_pred)
-        
-    return best_model, best_channels, best_accuracy, best_f1, best_cm 
+    Subsets are scored as sorted channel tuples, so every subset is evaluated at most once
+    whatever order it was built in. Missing scores of a batch are evaluated in parallel.
+    """
+
+    def __init__(self, gestures, model_name, cache_key=None, n_workers=TRAIN_WORKERS):
+        from sklearn.model_selection import StratifiedKFold
+
+        self.gestures = gestures
+        self.model_name = model_name
+        self.cache_key = cache_key
+        self.n_workers = n_workers
+        self.scores = {}
+        self._skf = StratifiedKFold(n_splits=4, shuffle=True, random_state=42)
+
+    def score(self, subsets):
+        """Return the proxy accuracy of every subset in order."""
+        subsets = [tuple(sorted(int(ch) for ch in subset)) for subset in subsets]
+        missing = list(dict.fromkeys(subset for subset in subsets if subset not in self.scores))
+
+        tasks = []
+        for subset in missing:
+            features, labels = calculate_features(self.gestures, list(subset), cache_key=self.cache_key)
+            tasks.append((self.model_name, features, labels, list(self._skf.split(features, labels))))
+
+        for subset, accuracy in zip(missing, run_tasks(cv_accuracy, tasks, self.n_workers)):
+            self.scores[subset] = accuracy
+
+        return [self.scores[subset] for subset in subsets]
+
+    def best(self, n):
+        """The n best scored subsets, larger accuracy first and smaller subsets first on ties."""
+        return sorted(self.scores, key=lambda subset: (-self.scores[subset], len(subset), subset))[:n]
+
+def search_channels(gestures, model_name, mode="forward", max_channels=SEARCH_MAX_CHANNELS, start=(), cache_key=None,
+                    proxy=SEARCH_PROXY, beam_width=SEARCH_BEAM_WIDTH, n_finalists=SEARCH_FINALISTS, budget=None,
+                    n_workers=TRAIN_WORKERS, refit_final=False, progress=None, trace=None):
+    """
+    Search channel subsets of up to max_channels channels instead of prefixes of one ranking.
+
+    Modes:
+    - forward: sequential forward selection, adds the channel that helps most.
+    - floating: sequential floating forward selection, after every addition removes channels
+      while that beats the best subset found so far of the smaller size.
+    - beam: keeps the beam_width best subsets of every size and extends all of them.
+
+    The search grows subsets from the channels in start, e.g. the top ranked channel; from
+    an empty start the first step scores all channel pairs, as a single channel has no
+    information after the RMS normalization. Subsets are screened with the memoized CV
+    accuracy of the cheap proxy classifier (the chosen classifier if proxy is None). The
+    search stops early once budget seconds have passed and at least one step is done; the n_finalists best screened subsets are then cross-validated with the chosen
+    classifier like train_model.
+
+    Returns:
+    - best_model, best_channels, best_accuracy, best_f1, best_cm
+    """
+    deadline = None if budget is None else time.monotonic() + budget
+
+    def out_of_time():
+        return deadline is not None and len(scorer.scores) > 0 and time.monotonic() > deadline
+
+    n_channels = gestures[0][0].shape[1]
+    max_channels = min(max_channels, n_channels)
+    scorer = SubsetScorer(gestures, proxy or model_name, cache_key, n_workers)
+
+    def extend(subset):
+        if not subset:
+            return list(itertools.combinations(range(n_channels), 2))
+        return [subset + (ch,) for ch in range(n_channels) if ch not in subset]
+
+    start = tuple(int(ch) for ch in start)
+
+    if mode == "beam":
+        beam = [start]
+
+        while len(beam[0]) < max_channels and not out_of_time():
+            candidates = list({tuple(sorted(c)): c for subset in beam for c in extend(subset)}.values())
+            scores = scorer.score(candidates)
+            order = np.argsort(scores, kind="stable")[::-1][:beam_width]
+            beam = [candidates[i] for i in order]
+
+            if progress is not None:
+                progress(stage="search", mode=mode, z=len(beam[0]), evaluated=len(scorer.scores),
+                         best_accuracy=float(scores[order[0]]))
+    else:
+        selected = start
+        best_by_size = {}
+
+        while len(selected) < max_channels and not out_of_time():
+            candidates = extend(selected)
+            scores = scorer.score(candidates)
+            selected = candidates[int(np.argmax(scores))]
+            best_by_size[len(selected)] = max(scores)
+
+            # conditional exclusion: drop channels while the smaller subset beats the best of its size
+            while mode == "floating" and len(selected) > 2 and not out_of_time():
+                reduced = [tuple(ch for ch in selected if ch != removed) for removed in selected[:-1]]
+                scores = scorer.score(reduced)
+                if max(scores) <= best_by_size.get(len(selected) - 1, 0):
+                    break
+                selected = reduced[int(np.argmax(scores))]
+                best_by_size[len(selected)] = max(scores)
+
+            if progress is not None:
+                progress(stage="search", mode=mode, z=len(selected), evaluated=len(scorer.scores),
+                         best_accuracy=float(max(best_by_size.values())))
+
+    finalists = [np.array(subset) for subset in scorer.best(n_finalists)]
+
+    if not finalists:
+        # the start subset already has max_channels channels, no step was run
+        finalists = [np.array(start)]
+
+    return cross_validate_subsets(finalists, gestures, model_name, cache_key, n_workers, refit_final, progress, trace)
+
+HALVING_PROXY = "Logistic Regression"
+HALVING_MIN_FRACTION = 0.25
+HALVING_ETA = 3
+HALVING_FOLDS = 2
+
+def subsample_trials(labels, fraction, seed=42):
+    """Indices of a seeded, stratified fraction of the trials, at least two of every gesture."""
+    rng = np.random.default_rng(seed)
+    keep = []
+    for label in np.unique(labels):
+        trials = rng.permutation(np.flatnonzero(labels == label))
+        keep.append(trials[:max(2, int(np.ceil(fraction * len(trials))))])
+    return np.sort(np.concatenate(keep))
+
+def halving_sweep(subsets, gestures, model_name, cache_key=None, proxy=HALVING_PROXY, eta=HALVING_ETA,
+                  min_fraction=HALVING_MIN_FRACTION, n_folds=HALVING_FOLDS, n_finalists=SEARCH_FINALISTS, budget=None,
+                  n_workers=TRAIN_WORKERS, refit_final=False, progress=None, trace=None):
+    """
+    Successive halving over channel subsets, e.g. the z prefixes of a ranking.
+
+    Every rung scores the remaining subsets with the fast linear proxy classifier on a stratified
+    subsample of the trials and n_folds folds, then keeps the best 1 / eta of them (ties go
+    to the earlier subset); the next rung uses eta times more trials. Once n_finalists are
+    left they are cross-validated with the chosen classifier like train_model. After budget
+    seconds no further rung is run and only the best screened subset is cross-validated, so
+    the sweep returns the best result found so far.
+
+    Returns:
+    - best_model, best_channels, best_accuracy, best_f1, best_cm
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    deadline = None if budget is None else time.monotonic() + budget
+
+    def out_of_time():
+        return deadline is not None and time.monotonic() > deadline
+
+    if trace is None:
+        trace = JobTrace(classifier=model_name)
+
+    survivors = list(subsets)
+    fraction = min_fraction
+    rung = 0
+
+    while len(survivors) > n_finalists and (rung == 0 or not out_of_time()):
+        with trace.span("screening", rung=rung, subsets=len(survivors)) as span:
+            tasks = []
+            for selected_channels in survivors:
+                features, labels = calculate_features(gestures, selected_channels, cache_key=cache_key)
+                trials = subsample_trials(labels, fraction)
+                splits = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=42).split(features[trials], labels[trials])
+                tasks.append((proxy or model_name, features[trials], labels[trials], list(splits)))
+
+            scores = list(run_tasks(cv_accuracy, tasks, n_workers))
+            span["trials"] = len(tasks[0][2])
+
+        keep = max(n_finalists, int(np.ceil(len(survivors) / eta)))
+        order = np.argsort(-np.asarray(scores), kind="stable")[:keep]
+        survivors = [survivors[i] for i in order]
+
+        if progress is not None:
+            progress(stage="sweep", rung=rung, fraction=round(fraction, 3), kept=[len(subset) for subset in survivors],
+                     best_accuracy=float(scores[order[0]]))
+
+        fraction = min(1.0, fraction * eta)
+        rung += 1
+
+    if out_of_time():
+        survivors = survivors[:1]
+
+    return cross_validate_subsets(survivors[:n_finalists], gestures, model_name, cache_key, n_workers, refit_final, progress, trace)
 
 def bandpass_filter(data, fs, lowcut=20, highcut=450, order=4):
     """
     Apply a Butterworth band-pass filter.
     """
+    from scipy.signal import butter, filtfilt
+
     nyq = 0.5 * fs
     low = lowcut / nyq
     high = highcut / nyq
@@ -449,6 +1750,8 @@ def notch_filter(data, fs, notch_freq=50, Q=50):
     """
     Apply a digital IIR notch filter to remove power-line noise.
     """
+    from scipy.signal import filtfilt, iirnotch
+
     # Normalize notch frequency
     nyq = 0.5 * fs
     w0 = notch_freq / nyq  # normalized frequency
@@ -459,205 +1762,921 @@ def compute_rms(signal):
     """Computes RMS for a given signal window."""
     return np.sqrt(np.mean(np.square(signal), axis=0))
 
-def segment_gesture(data, rest_rms, window_size=150, median_filter_size=3):
-    """Segments the gesture based on RMS thresholding."""
+def segment_gestures(trials, rest_rms, window_size=150, median_filter_size=3):
+    """
+    Segments every trial of a list or GestureDataset based on RMS thresholding, all trials in one pass.
+
+    Each trial is cut into windows of window_size samples. The per-channel RMS of every window
+    minus rest_rms is median filtered across channels and summed; windows above the trial's
+    mean are active, single inactive windows between active ones are filled, and the longest
+    active run (the first one on ties) is the segment.
+
+    Returns:
+    - segments: list of (segment_start, segment_end) sample indices, (0, 0) if a trial has no active window.
+    """
+    squared, offsets, _ = pack_samples(trials if isinstance(trials, GestureDataset) else {0: trials}, ufunc=np.square)
+    n_trials = len(offsets) - 1
+
+    n_windows = (offsets[1:] - offsets[:-1]) // window_size
+    window_offsets = np.concatenate([[0], np.cumsum(n_windows)])
+    trial_of_window = np.repeat(np.arange(n_trials), n_windows)
 
-    num_samples, num_channels = data.shape
-    num_windows = num_samples // window_size 
+    starts = offsets[trial_of_window] + (np.arange(window_offsets[-1]) - window_offsets[trial_of_window]) * window_size
+    windows = window_matrix(starts, np.full(len(starts), window_size), len(squared))
 
     # Compute RMS for each window
-    rms_values = np.array([
-        compute_rms(data[i * window_size: (i + 1) * window_size]) - rest_rms
-        for i in range(num_windows)
-    ])
+    rms_values = np.sqrt(windows @ squared / window_size) - rest_rms
 
-    rms_values_filtered = np.array([
-        medfilt(i, median_filter_size)
-        for i in rms_values
-    ])
+    # same zero padded median filter as medfilt, applied to every window row
+    rms_values_filtered = median_filter(rms_values, size=(1, median_filter_size), mode='constant', cval=0.0)
 
     summarized_rms = np.sum(rms_values_filtered, axis=1)
 
-    threshold = np.mean(summarized_rms)
+    has_windows = n_windows > 0
+    threshold = np.zeros(n_trials)
+    threshold[has_windows] = np.add.reduceat(summarized_rms, window_offsets[:-1][has_windows]) / n_windows[has_windows]
 
-    active_windows = summarized_rms > threshold
-    
-    # Fill gaps (set inactive windows as active if neighbors are active)
-    for i in range(1, len(active_windows) - 1):
-        if not active_windows[i] and active_windows[i - 1] and active_windows[i + 1]:
-            active_windows[i] = True
-    
-    # Find longest contiguous active segment
-    max_length, best_start, current_length, current_start = 0, 0, 0, None
-    for i, active in enumerate(active_windows):
-        if active:
-            if current_start is None:
-                current_start = i
-            current_length += 1
-        else:
-            if current_length > max_length:
-                max_length, best_start = current_length, current_start
-            current_length, current_start = 0, None
-    
-    if current_length > max_length:
-        max_length, best_start = current_length, current_start
-    
-    # Extract segment indices
-    segment_start, segment_end = best_start * window_size, (best_start + max_length) * window_size
-    return segment_start, segment_end
+    active_windows = summarized_rms > threshold[trial_of_window]
+
+    first = np.zeros(len(active_windows), dtype=bool)
+    first[window_offsets[:-1][has_windows]] = True
+    last = np.zeros(len(active_windows), dtype=bool)
+    last[window_offsets[1:][has_windows] - 1] = True
+
+    # Fill gaps (set inactive windows as active if neighbors in the same trial are active)
+    previous_active = np.concatenate([[False], active_windows[:-1]]) & ~first
+    next_active = np.concatenate([active_windows[1:], [False]]) & ~last
+    active_windows |= previous_active & next_active
+
+    # Find contiguous active runs
+    previous_active = np.concatenate([[False], active_windows[:-1]]) & ~first
+    next_active = np.concatenate([active_windows[1:], [False]]) & ~last
+    run_starts = np.flatnonzero(active_windows & ~previous_active)
+    run_lengths = np.flatnonzero(active_windows & ~next_active) + 1 - run_starts
+    run_trials = trial_of_window[run_starts]
+
+    # longest run of every trial, earliest first on ties
+    order = np.lexsort((run_starts, -run_lengths, run_trials))
+    trials_with_runs, best = np.unique(run_trials[order], return_index=True)
+
+    segments = [(0, 0)] * n_trials
+
+    for trial, run in zip(trials_with_runs, order[best]):
+        best_start = run_starts[run] - window_offsets[trial]
+        segments[trial] = (int(best_start * window_size), int((best_start + run_lengths[run]) * window_size))
+
+    return segments
+
+def segment_gesture(data, rest_rms, window_size=150, median_filter_size=3):
+    """Segments the gesture based on RMS thresholding; a GestureDataset gives the segments of all its trials."""
+    if isinstance(data, GestureDataset):
+        return segment_gestures(data, rest_rms, window_size, median_filter_size)
+    return segment_gestures([data], rest_rms, window_size, median_filter_size)[0]
+
+def crop_segments(dataset, segments, min_length=3, keep=()):
+    """
+    Cut every trial of a GestureDataset to its (start, end) segment, without copying samples.
+
+    Trials of the gestures in keep stay whole, and so do trials whose segment is shorter than
+    min_length samples, e.g. the (0, 0) of trials shorter than two segmentation windows, so
+    every trial still fills the feature windows.
+    """
+    segments = np.array(segments, dtype=np.int64).reshape(-1, 2)
+
+    whole = (segments[:, 1] - segments[:, 0] < min_length) | np.isin(dataset.labels, [dataset.gestures.index(g) for g in keep])
+    segments[whole, 0] = 0
+    segments[whole, 1] = dataset.lengths[whole]
+
+    return dataset.crop(segments)
+
+PREPROCESS_DIR = os.environ.get("SPARSEEMG_PREPROCESS_DIR", "cache/preprocessed")
+PREPROCESS_THREADS = int(os.environ.get("SPARSEEMG_PREPROCESS_THREADS", os.cpu_count() or 1))
+PREPROCESS_BATCH_SIZE = 16
+
+@lru_cache(maxsize=32)
+def filter_sos(fs, lowcut=20, highcut=450, notch_freq=50, Q=50, order=4):
+    """
+    Design the notch + Butterworth band-pass cascade used for preprocessing as second-order sections.
+
+    Designs are cached per parameter set, so a dataset is filtered with a single design.
+    """
+    from scipy.signal import butter, iirnotch, tf2sos
+
+    nyq = 0.5 * fs
+    b, a = iirnotch(notch_freq / nyq, Q)
+    notch = tf2sos(b, a)
+    bandpass = butter(order, [lowcut / nyq, highcut / nyq], btype='band', output='sos')
+    return np.vstack([notch, bandpass])
 
 def preprocess(sample, fs):
-    sample_ = np.array(sample)
-    sample_ = notch_filter(sample_, fs)
-    sample_ = bandpass_filter(sample_, fs)
-    return sample_
+    from scipy.signal import sosfiltfilt
+    return sosfiltfilt(filter_sos(fs), np.asarray(sample, dtype=float), axis=0)
+
+def preprocess_trials(trials, fs, batch_size=PREPROCESS_BATCH_SIZE, n_threads=PREPROCESS_THREADS):
+    """Zero-phase filter a list of trials in batches across a thread pool; SciPy releases the GIL while filtering."""
+    from scipy.signal import sosfiltfilt
+
+    sos = filter_sos(fs)
+
+    def filter_batch(batch):
+        return [sosfiltfilt(sos, np.asarray(sample, dtype=float), axis=0) for sample in batch]
+
+    batches = [trials[i:i + batch_size] for i in range(0, len(trials), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as executor:
+        return [sample for batch in executor.map(filter_batch, batches) for sample in batch]
+
+def preprocessed_dataset_path(ds_number, ds_filename, fs):
+    """
+    Return the columnar copy of a dataset with every trial filtered, creating it on first use.
+
+    The copy is keyed by the source content and fs, so identical uploads are filtered once.
+    """
+    source = dataset_path(ds_number, ds_filename)
+    path = os.path.join(PREPROCESS_DIR, f"{dataset_cache.digest(source)}-{fs}-{DATASET_DTYPE}{COLUMNAR_SUFFIX}")
+
+    if not os.path.isdir(path):
+        dataset = dataset_cache.get(source)
+        keys = dataset.keys()
+        trials = [dataset[g] for g in keys]
+
+        filtered = iter(preprocess_trials([sample for samples in trials for sample in samples], fs))
+
+        os.makedirs(PREPROCESS_DIR, exist_ok=True)
+        convert_to_columnar({g: [next(filtered) for _ in samples] for g, samples in zip(keys, trials)}, path)
+
+    return path
+
+DATASETS_DIR = os.environ.get("SPARSEEMG_DATASETS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "datasets"))
+STENCIL_CACHE_SIZE = int(os.environ.get("SPARSEEMG_STENCIL_CACHE_SIZE", 256))
+STENCIL_FORMATS = ("svg", "pdf")
 
 class StencilRequest(BaseModel):
     ds: str
     circumference_values: List[float]
     selected_electrodes: List[int]
+    format: str = "svg"
+
+class StencilBatchRequest(BaseModel):
+    stencils: List[StencilRequest]
+    format: str = "pdf"
+
+@lru_cache(maxsize=1)
+def dataset_metadata():
+    """Metadata of the bundled datasets (datasets/*/dataset_metadata*.json) by lower-cased dataset name."""
+    metadata = {}
+    for root, _, files in os.walk(DATASETS_DIR):
+        for name in files:
+            if name.startswith("dataset_metadata") and name.endswith(".json"):
+                with open(os.path.join(root, name)) as f:
+                    meta = json.load(f)
+                metadata[meta["dataset_name"].lower()] = meta
+    return metadata
+
+def electrode_grid(ds):
+    """Rows and columns of a dataset's electrode grid, from its metadata."""
+    meta = dataset_metadata().get(ds.lower())
+    if meta is None:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset {ds}")
+    return meta["number_of_rows"], meta["number_of_columns"]
+
+@lru_cache(maxsize=STENCIL_CACHE_SIZE)
+def stencil_layout(num_rows, num_cols, circumference_values, selected_electrodes):
+    """
+    Compute the geometry of a stencil in points, with y growing downwards as in SVG.
 
-def find_coordinates_stacked(matrix, numbers):
-    coords = set()
-    num_rows = len(matrix)
-    
-    for row_index, row in enumerate(matrix):
-        x = num_rows - 1 - row_index  # Flip row index to match your desired x
-        for y, value in enumerate(row):
-            if value in numbers:
-                coords.add((x, y))
-                
-    return coords
+    Electrodes are numbered row by row from 1, the first row at the bottom of the page. Row
+    i is a band of num_cols ellipses spaced circumference_values[i] / num_cols apart, every
+    selected electrode gets a pair of circles on top. The page is letter-like 750 x 550 and
+    grows for grids that do not fit.
+
+    Returns:
+    - layout: dict with the page width and height, the number of columns and lists of rects
+      (x, y, width, height), ellipses (cx, cy, rx, ry, row by row) and circles (cx, cy, r),
+      circles to be drawn last.
+    """
+    mm_to_points = 72 / 25.4
+    cm_to_points = 72 / 2.54
+
+    ellipse_width = 5 * mm_to_points
+    ellipse_height = 5 * mm_to_points
+    vertical_spacing = 2.0 * cm_to_points
+    circle_radius = 20 * mm_to_points / 2
+
+    row_spacings = np.array(circumference_values, dtype=float) / num_cols * cm_to_points
+    max_row_width = np.max(row_spacings) * (num_cols - 1)
+    grid_height = (num_rows - 1) * vertical_spacing
+
+    page_width = max(750, max_row_width + ellipse_width + 60 + 30)
+    page_height = max(550, grid_height + 2 * cm_to_points + 2 * circle_radius + 30)
+
+    x_margin_global = (page_width - max_row_width) / 2
+    y_margin = (page_height - grid_height) / 2
+
+    selected = {((e - 1) // num_cols, (e - 1) % num_cols) for e in selected_electrodes}
+
+    rects, ellipses, circles = [], [], []
+    y_position = page_height - y_margin
+
+    for row, horizontal_spacing in enumerate(row_spacings):
+        row_width = (num_cols - 1) * horizontal_spacing
+        x_margin = x_margin_global + (max_row_width - row_width) / 2
+
+        # band around the row
+        rects.append((x_margin - ellipse_width / 2 - 30, y_position - ellipse_height / 2,
+                      row_width + ellipse_width + 60, 2 * cm_to_points))
+
+        for col in range(num_cols):
+            x = x_margin + col * horizontal_spacing
+
+            if (row, col) in selected:
+                circles.append((x, y_position, circle_radius / 2))
+                circles.append((x, y_position - circle_radius, circle_radius / 2))
+
+            ellipses.append((x, y_position, ellipse_width / 2, ellipse_height / 2))
+
+        y_position -= vertical_spacing
+
+    return {"width": page_width, "height": page_height, "columns": num_cols,
+            "rects": rects, "ellipses": ellipses, "circles": circles}
+
+def render_svg(layout):
+    def coord(value):
+        return str(round(value, 2))
+
+    style = {"stroke": "black", "stroke_width": "0.001", "fill": "white"}
+
+    svg = ET.Element('svg', xmlns="http://www.w3.org/2000/svg", width=str(round(layout["width"])),
+                     height=str(round(layout["height"])), version="1.1")
+
+    num_cols = layout["columns"]
+
+    for row, (x, y, width, height) in enumerate(layout["rects"]):
+        ET.SubElement(svg, 'rect', x=coord(x), y=coord(y), width=coord(width), height=str(height), **style)
+        for cx, cy, rx, ry in layout["ellipses"][row * num_cols:(row + 1) * num_cols]:
+            ET.SubElement(svg, 'ellipse', cx=coord(cx), cy=coord(cy), rx=coord(rx), ry=coord(ry), **style)
+
+    for cx, cy, r in layout["circles"]:
+        ET.SubElement(svg, 'circle', cx=coord(cx), cy=coord(cy), r=coord(r), **style)
+
+    return ET.tostring(svg, encoding='utf-8', xml_declaration=True)
+
+def render_pdf(layouts):
+    """Draw every layout on its own page of one PDF, flipping y to PDF's bottom-up coordinates."""
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+
+    for layout in layouts:
+        height = layout["height"]
+        pdf.setPageSize((layout["width"], height))
+        pdf.setStrokeColorRGB(0, 0, 0)
+        pdf.setFillColorRGB(1, 1, 1)
+
+        for x, y, width, rect_height in layout["rects"]:
+            pdf.rect(x, height - y - rect_height, width, rect_height, stroke=1, fill=1)
+        for cx, cy, rx, ry in layout["ellipses"]:
+            pdf.ellipse(cx - rx, height - cy - ry, cx + rx, height - cy + ry, stroke=1, fill=1)
+        for cx, cy, r in layout["circles"]:
+            pdf.circle(cx, height - cy, r, stroke=1, fill=1)
+
+        pdf.showPage()
+
+    pdf.save()
+    return buffer.getvalue()
+
+def stencil_key(request):
+    """Hashable layout arguments of a request; electrode order and duplicates do not change the stencil."""
+    num_rows, num_cols = electrode_grid(request.ds)
+    if len(request.circumference_values) != num_rows:
+        raise HTTPException(status_code=422, detail=f"{request.ds} needs {num_rows} circumference values")
+    return num_rows, num_cols, tuple(float(c) for c in request.circumference_values), tuple(sorted(set(request.selected_electrodes)))
+
+@lru_cache(maxsize=STENCIL_CACHE_SIZE)
+def render_stencil(key, fmt):
+    layout = stencil_layout(*key)
+    return render_svg(layout) if fmt == "svg" else render_pdf([layout])
+
+STENCIL_MEDIA_TYPES = {"svg": "image/svg+xml", "pdf": "application/pdf", "zip": "application/zip"}
 
 @app.post("/generate_stencil")
 def generate_stencil(request: StencilRequest):
-    ds_mapping = {"CSL-HDEMG": 1, "DELTA": 2, "GrabMyo": 3, "PutEMG": 4, "Hyser": 5, "Nizamis et al.": 6}
+    """Render a stencil in memory and return it as SVG or PDF; identical requests are served from a cache."""
+    if request.format not in STENCIL_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(STENCIL_FORMATS)}")
 
-    ds_number = ds_mapping[request.ds]
+    body = render_stencil(stencil_key(request), request.format)
+    return Response(body, media_type=STENCIL_MEDIA_TYPES[request.format],
+                    headers={"Content-Disposition": f'inline; filename="stencil.{request.format}"'})
 
-    # Settings
-    output_filename = "static/ellipse_grid_variable_spacing.svg"
-    page_width, page_height = (750, 550)  # Letter size: 8.5 x 11 inches (215.9 x 279.4 mm)
+@app.post("/generate_stencils")
+def generate_stencils(request: StencilBatchRequest):
+    """Render many stencils at once, as one PDF with a page per stencil or a zip of SVG files."""
+    if request.format not in STENCIL_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(STENCIL_FORMATS)}")
 
-    # Grid settings (values in cm for each row)
-    row_spacings_cm = np.array(request.circumference_values)
-    row_spacings_cm /= 8
+    keys = [stencil_key(stencil) for stencil in request.stencils]
 
-    ellipse_width_mm = 5  # Ellipse width in mm
-    ellipse_height_mm = 5  # Ellipse height in mm
-    vertical_spacing_cm = 2.0  # Uniform vertical spacing in cm
-    circle_diameter_mm = 20  # Circle diameter in mm
+    if request.format == "pdf":
+        body, media_type = render_pdf([stencil_layout(*key) for key in keys]), "pdf"
+    else:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for i, key in enumerate(keys):
+                archive.writestr(f"stencil_{i + 1}.svg", render_stencil(key, "svg"))
+        body, media_type = buffer.getvalue(), "zip"
+
+    return Response(body, media_type=STENCIL_MEDIA_TYPES[media_type],
+                    headers={"Content-Disposition": f'attachment; filename="stencils.{media_type}"'})
+
+MAX_UPLOAD_BYTES = int(os.environ.get("SPARSEEMG_MAX_UPLOAD_BYTES", 2 * 1024 ** 3))
+UPLOAD_CHUNK_BYTES = 1 << 20
+# multipart boundaries and part headers sent with a POST /upload file
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+class GestureUnpickler(pickle.Unpickler):
+    """Unpickler that only rebuilds NumPy arrays and builtins, so validating an upload cannot run its code."""
+
+    ALLOWED = {
+        ("numpy", "ndarray"), ("numpy", "dtype"),
+        ("numpy.core.multiarray", "_reconstruct"), ("numpy._core.multiarray", "_reconstruct"),
+        ("numpy.core.multiarray", "scalar"), ("numpy._core.multiarray", "scalar"),
+        ("numpy.core.numeric", "_frombuffer"), ("numpy._core.numeric", "_frombuffer"),
+        ("collections", "OrderedDict"),
+    }
 
-    # Convert mm and cm to points
-    mm_to_points = 72 / 25.4
-    cm_to_points = 72 / 2.54
+    def find_class(self, module, name):
+        if (module, name) not in self.ALLOWED:
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a dataset")
+        return super().find_class(module, name)
 
-    ellipse_width = ellipse_width_mm * mm_to_points
-    ellipse_height = ellipse_height_mm * mm_to_points
-    vertical_spacing = vertical_spacing_cm * cm_to_points
-    circle_diameter = circle_diameter_mm * mm_to_points
-    circle_radius = circle_diameter / 2
+def validate_gestures(filename):
+    """
+    Check that an uploaded file is a gesture dict that training can use.
 
-    # Calculate grid dimensions and margins
-    num_cols = 8
-    row_widths = row_spacings_cm * (num_cols - 1) * cm_to_points
-    max_row_width = np.max(row_widths)
-    grid_height = (len(row_spacings_cm) - 1) * vertical_spacing
-    grid_width = max_row_width
+    The dict must map integer gesture numbers, rest (0) included, to lists of at least 4
+    trials (one per CV fold), every trial a finite, numeric (samples, channels) array with
+    the same number of channels.
 
-    x_margin_global = (page_width - grid_width) / 2
-    y_margin = (page_height - grid_height) / 2
+    Returns:
+    - summary: dict with the number of gestures, trials, channels and samples.
 
-    # Positions where ellipses are replaced with circles
-    matrix = [
-        [17, 18, 19, 20, 21, 22, 23, 24],
-        [9, 10, 11, 12, 13, 14, 15, 16],
-        [1, 2, 3, 4, 5, 6, 7, 8]
-    ]
-    
-    replacement_positions = find_coordinates_stacked(matrix, request.selected_electrodes)
-
-    # Create SVG root
-    svg = ET.Element('svg', xmlns="http://www.w3.org/2000/svg", width=str(page_width), height=str(page_height), version="1.1")
-
-    def create_grid_with_variable_spacing():
-        y_position = page_height - y_margin  # Start from the top of the grid
-        circle_elements = []  # Hold circle elements to draw them later
-
-        for row, horizontal_spacing_cm in enumerate(row_spacings_cm):
-            horizontal_spacing = horizontal_spacing_cm * cm_to_points
-            row_width = (num_cols - 1) * horizontal_spacing
-            x_margin = x_margin_global + (max_row_width - row_width) / 2
-            row_x_min = x_margin
-            row_x_max = x_margin + row_width
-            row_y_min = y_position - ellipse_height / 2
-
-            # Draw rectangle around the row
-            ET.SubElement(svg, 'rect',
-                        x=str(round(row_x_min - (ellipse_width / 2) - 30, 2)),
-                        y=str(round(row_y_min, 2)),
-                        width=str(round(row_x_max - row_x_min + ellipse_width + 60, 2)),
-                        height=str(2 * cm_to_points),
-                        stroke="black", stroke_width="0.001", fill="white")
-
-            for col in range(num_cols):
-                x = x_margin + col * horizontal_spacing
-
-                if (row, col) in replacement_positions:
-                    # Store circles to render after ellipses
-                    left_circle = ET.Element('circle',
-                                            cx=str(round(x, 2)),
-                                            cy=str(round(y_position, 2)),
-                                            r=str(round(circle_radius / 2, 2)),
-                                            stroke="black", stroke_width="0.001", fill="white")
-
-                    right_circle = ET.Element('circle',
-                                            cx=str(round(x, 2)),
-                                            cy=str(round(y_position - circle_radius, 2)),
-                                            r=str(round(circle_radius / 2, 2)),
-                                            stroke="black", stroke_width="0.001", fill="white")
-
-                    circle_elements.extend([left_circle, right_circle])
-
-                # Draw ellipse (beneath the circles)
-                ET.SubElement(svg, 'ellipse',
-                            cx=str(round(x, 2)),
-                            cy=str(round(y_position, 2)),
-                            rx=str(round(ellipse_width / 2, 2)),
-                            ry=str(round(ellipse_height / 2, 2)),
-                            stroke="black", stroke_width="0.001", fill="white")
-
-            y_position -= vertical_spacing
-
-        # Add all circles last to bring them on top
-        for circle in circle_elements:
-            svg.append(circle)
-
-    create_grid_with_variable_spacing()
-
-    # Remove namespace for compatibility
-    def remove_namespace(tag):
-        if '}' in tag:
-            return tag.split('}', 1)[1]
-        return tag
-
-    for elem in svg.iter():
-        elem.tag = remove_namespace(elem.tag)
-
-    # Write SVG file
-    svg_tree = ET.ElementTree(svg)
-    svg_tree.write(output_filename, encoding='utf-8', xml_declaration=True)
-
-    print(f"✅ SVG with centered grid and top-layer circles generated: {output_filename}")
+    Raises:
+    - ValueError describing the first problem found.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            gestures = GestureUnpickler(f).load()
+    except Exception as e:
+        raise ValueError(f"not a pickled gesture dataset: {e}")
+
+    if not isinstance(gestures, dict) or not gestures:
+        raise ValueError("the dataset must be a non-empty dict of gesture number to trials")
+    if not all(isinstance(g, (int, np.integer)) for g in gestures):
+        raise ValueError("gesture numbers must be integers")
+    if 0 not in gestures:
+        raise ValueError("gesture 0 (rest) is missing")
+
+    n_channels = None
+    n_trials = n_samples = 0
+
+    for g, samples in gestures.items():
+        if not isinstance(samples, (list, tuple)) or len(samples) < 4:
+            raise ValueError(f"gesture {g} needs a list of at least 4 trials")
+
+        for sample in samples:
+            sample = np.asarray(sample)
+            if sample.ndim != 2 or not np.issubdtype(sample.dtype, np.number) or not len(sample):
+                raise ValueError(f"trials of gesture {g} must be non-empty numeric (samples, channels) arrays")
+            if n_channels is not None and sample.shape[1] != n_channels:
+                raise ValueError(f"gesture {g} has a trial with {sample.shape[1]} channels instead of {n_channels}")
+            if not np.all(np.isfinite(sample)):
+                raise ValueError(f"gesture {g} has a trial with NaN or infinite values")
+
+            n_channels = sample.shape[1]
+            n_trials += 1
+            n_samples += len(sample)
+
+    return {"gestures": len(gestures), "trials": n_trials, "channels": n_channels, "samples": n_samples}
+
+def upload_path(content_id):
+    return os.path.join(UPLOAD_DIR, f"{content_id}.pkl")
+
+def convert_upload(content_id):
+    """Convert a validated upload to the columnar layout, which dataset_path prefers from then on."""
+    path = upload_path(content_id)
+    if not os.path.isdir(columnar_path(path)):
+        convert_pickle_to_columnar(path)
+
+async def ingest_upload(chunks, background_tasks):
+    """
+    Store an uploaded dataset under its content hash.
+
+    The chunks are hashed and written to a temporary file as they arrive, off the event loop,
+    and the upload is aborted once it exceeds MAX_UPLOAD_BYTES. Content that is already
+    stored is not written again; new content is validated before it is kept and converted
+    to the columnar layout in the background.
+    """
+    tmp_file = os.path.join(UPLOAD_DIR, f".incoming-{os.getpid()}-{id(chunks)}")
+    digest = hashlib.sha256()
+    size = 0
+
+    def write(f, chunk):
+        digest.update(chunk)
+        f.write(chunk)
+
+    try:
+        f = await asyncio.to_thread(open, tmp_file, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+                await asyncio.to_thread(write, f, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+
+        content_id = digest.hexdigest()
+        path = upload_path(content_id)
+        duplicate = os.path.exists(path)
+
+        if duplicate:
+            summary = None
+        else:
+            try:
+                summary = await asyncio.to_thread(validate_gestures, tmp_file)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    background_tasks.add_task(convert_upload, content_id)
+
+    return {
+        "content_id": content_id,
+        "filename": os.path.basename(path),
+        "size": size,
+        "duplicate": duplicate,
+        "dataset": summary,
+        "message": "File uploaded successfully",
+    }
+
+def upload_length(request, limit):
+    """Return the Content-Length of an upload request, None if it is not sent; rejects invalid and oversized ones."""
+    length = request.headers.get("content-length")
+    if length is None:
+        return None
 
+    try:
+        length = int(length)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPException(status_code=400, detail="invalid Content-Length header")
+
+    if length > limit:
+        raise HTTPException(status_code=413, detail=f"uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+    return length
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    file_location = f"{UPLOAD_DIR}/{file.filename}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def upload_file(request: Request, background_tasks: BackgroundTasks):
+    """
+    Upload a pickled gesture dataset as the multipart form file "file"; returns its content_id.
+
+    This is the legacy path: Starlette spools the form file to a temporary file before it is
+    hashed, so PUT /upload should be preferred. The body is counted while it is received and
+    the upload is refused once it cannot fit in MAX_UPLOAD_BYTES, before it is spooled whole.
+    """
+    limit = MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD
+    upload_length(request, limit)
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        received += len(message.get("body", b""))
+        if received > limit:
+            raise HTTPException(status_code=413, detail=f"uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+        return message
+
+    form = await Request(request.scope, receive).form(max_files=1)
+    file = form.get("file")
+
+    try:
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=422, detail="the form has no file field \"file\"")
+
+        async def chunks():
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+
+        return await ingest_upload(chunks(), background_tasks)
+    finally:
+        await form.close()
+
+@app.put("/upload")
+async def upload_stream(request: Request, background_tasks: BackgroundTasks):
+    """Upload a pickled gesture dataset as the raw request body, streamed without buffering it whole."""
+    upload_length(request, MAX_UPLOAD_BYTES)
+
+    return await ingest_upload(request.stream(), background_tasks)
+
+@app.get("/uploads/{content_id}")
+def get_upload(content_id: str):
+    path = upload_path(os.path.basename(content_id))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {"content_id": content_id, "size": os.path.getsize(path), "converted": os.path.isdir(columnar_path(path))}
+
+MAX_RUNNING_JOBS = int(os.environ.get("SPARSEEMG_MAX_RUNNING_JOBS", 2))
+MAX_QUEUED_JOBS = int(os.environ.get("SPARSEEMG_MAX_QUEUED_JOBS", 16))
+
+class JobQueueFull(Exception):
+    pass
+
+class JobCancelled(Exception):
+    """Raised inside a training job at its next progress call once the job has been cancelled."""
+
+class JobScheduler:
+    """
+    Runs blocking training jobs in a bounded thread pool off the event loop.
+
+    At most max_running jobs run at once and at most max_queued wait for a slot; further
+    submissions are rejected with JobQueueFull. Waiting jobs are told their queue position
+    and running jobs stream progress events, both through the job's async on_event callback.
+
+    Cancelling submit cancels the job cooperatively: its next progress call, between stages,
+    z values and folds, raises JobCancelled in the job thread. If no other job is running,
+    the sweep pool is terminated as well so that fits already running stop at once. The
+    job keeps its slot until its thread has returned.
+    """
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, max_queued=MAX_QUEUED_JOBS):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.running = 0
+        self.waiting = []
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="train")
+        self._changed = None
+
+    async def submit(self, fn, on_event):
+        """
+        Run fn(progress) once a slot is free and return its result.
+
+        fn is called in a worker thread; every progress(**event) call it makes is delivered
+        to on_event on the event loop, with the seconds since the job started as elapsed.
+        """
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+
+        if len(self.waiting) >= self.max_queued:
+            raise JobQueueFull()
+
+        ticket = object()
+        self.waiting.append(ticket)
+
+        try:
+            async with self._changed:
+                position = None
+                while self.running >= self.max_running or self.waiting[0] is not ticket:
+                    if self.waiting.index(ticket) + 1 != position:
+                        position = self.waiting.index(ticket) + 1
+                        await on_event({"type": "queued", "position": position})
+                    await self._changed.wait()
+
+                self.waiting.remove(ticket)
+                self.running += 1
+        except BaseException:
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+                async with self._changed:
+                    self._changed.notify_all()
+            raise
+
+        try:
+            return await self._run(fn, on_event)
+        finally:
+            async with self._changed:
+                self.running -= 1
+                self._changed.notify_all()
+
+    async def _run(self, fn, on_event):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        started = time.monotonic()
+        cancelled = threading.Event()
+        stage = ["queued"]
+
+        def progress(**event):
+            if cancelled.is_set():
+                raise JobCancelled()
+            stage[0] = event.get("stage", stage[0])
+            event = {"type": "progress", **event, "elapsed": round(time.monotonic() - started, 2)}
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        result = loop.run_in_executor(self._executor, fn, progress)
+
+        try:
+            while not result.done() or not events.empty():
+                next_event = asyncio.ensure_future(events.get())
+                try:
+                    done, _ = await asyncio.wait({next_event, result}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    if not next_event.done():
+                        next_event.cancel()
+
+                if next_event in done:
+                    await on_event(next_event.result())
+        except BaseException:
+            # cancelled, or on_event failed and nobody gets the result
+            cancelled.set()
+            # other jobs may have fits in the shared pool
+            if self.running == 1:
+                terminate_sweep_pool()
+            await asyncio.wait({result})
+            # the job fails with JobCancelled, or with a broken pool if its workers were killed
+            result.cancelled() or result.exception()
+
+            metrics.inc("sparseemg_cancelled_jobs_total", stage=stage[0])
+            metrics.inc("sparseemg_cancelled_job_seconds_total", time.monotonic() - started)
+            raise
+
+        return result.result()
+
+scheduler = JobScheduler()
+
+RESULT_CACHE_DIR = os.environ.get("SPARSEEMG_RESULT_CACHE_DIR", "cache/results")
+RESULT_CACHE_BYTES = int(os.environ.get("SPARSEEMG_RESULT_CACHE_BYTES", 64 * 1024 ** 2))
+
+class ResultStore:
+    """
+    Persistent store of training results keyed by request hash, one JSON file per result.
+
+    Reading a result refreshes its mtime; when the store grows beyond max_bytes the
+    least recently used results are deleted.
+    """
+
+    def __init__(self, path=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._file(key)) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        os.utime(self._file(key))
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        tmp_file = f"{self._file(key)}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_file, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_file, self._file(key))
+
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+result_store = ResultStore()
+
+# training jobs currently computing a result by request hash: their result future, their
+# task, the connections waiting for them and where their events go
+inflight_results = {}
+
+def training_key(params, dataset_digest):
+    """Hash the parameters that determine a training result together with the dataset content."""
+    key = {
+        "dataset": dataset_digest,
+        "selected_gestures": sorted(params["selected_gestures"]),
+        "channels": params["channels"],
+        "classifier": params["classifier"],
+        "metric": params["metric"],
+        "no_of_channels": params["no_of_channels"],
+        "area_no_of_channels": len(params["area_no_of_channels"]),
+        "optimize_further": bool(params["optimize_further"]),
+        "search": params["search"],
+        "search_budget": params["search_budget"],
+        # datasets are trained on as stored, see SPARSEEMG_DATASET_DTYPE
+        "dtype": str(DATASET_DTYPE),
+    }
+
+    if params["ds_number"] == 0:
+        key["fs"] = params["fs"]
+        key["apply_preprocess"] = params["apply_preprocess"] != "False"
+
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+async def cached_training(key, job, on_event):
+    """
+    Return the stored result for key, or compute it with the scheduler.
+
+    Identical requests arriving while the result is computed wait for the same job, which
+    sends its events to the request that started it. The job runs as its own task; once
+    every request waiting for it has been cancelled, e.g. because its client disconnected,
+    the job is cancelled too and no longer shared. The result store is read and written off the event loop.
+    """
+    entry = inflight_results.get(key)
+
+    if entry is None:
+        result = await asyncio.to_thread(result_store.get, key)
+        if result is not None:
+            return result
+
+        # an identical request may have started the job while the store was read
+        entry = inflight_results.get(key)
+
+    if entry is None:
+        future = asyncio.get_running_loop().create_future()
+        # followers may be gone by the time the job fails
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        entry = inflight_results[key] = {"future": future, "waiters": 0, "on_event": on_event}
+        entry["task"] = asyncio.ensure_future(compute_result(key, job, entry))
+
+    entry["waiters"] += 1
+
+    try:
+        return await asyncio.shield(entry["future"])
+    except asyncio.CancelledError:
+        entry["waiters"] -= 1
+        if entry["on_event"] is on_event:
+            entry["on_event"] = None
+        if entry["waiters"] == 0:
+            # the job may take a while to stop, identical requests from now on start a new one
+            if inflight_results.get(key) is entry:
+                del inflight_results[key]
+            entry["task"].cancel()
+        raise
+
+async def compute_result(key, job, entry):
+    """Run the job of an inflight_results entry with the scheduler and resolve its future."""
+    async def send(event):
+        # events of a job whose first requester left are dropped; a failed send means it left
+        # too, but the job goes on for the other waiters and is only cancelled by cached_training
+        if entry["on_event"] is not None:
+            try:
+                await entry["on_event"](event)
+            except Exception:
+                entry["on_event"] = None
+
+    try:
+        result = await scheduler.submit(job, send)
+        await asyncio.to_thread(result_store.put, key, result)
+        entry["future"].set_result(result)
+    except asyncio.CancelledError:
+        entry["future"].cancel()
+        raise
+    except BaseException as e:
+        entry["future"].set_exception(e)
+    finally:
+        if inflight_results.get(key) is entry:
+            del inflight_results[key]
+
+def run_training(params, progress):
+    """Load, rank and sweep one training request; blocking, runs in a scheduler thread."""
+    ds_number = params["ds_number"]
+    ds_filename = params["ds_filename"]
+    selected_gestures = params["selected_gestures"]
+    channels = params["channels"]
+    fs = params["fs"]
+    apply_preprocess = params["apply_preprocess"]
+    classifier = params["classifier"]
+    metric = params["metric"]
+    no_of_channels = params["no_of_channels"]
+    area_no_of_channels = params["area_no_of_channels"]
+    optimize_further = params["optimize_further"]
+
+    trace = JobTrace(params.get("model_id"), classifier=classifier, metric=metric)
+    cache_counts = cache_stats()
+
+    progress(stage="loading")
+
+    if ds_number == 0 and apply_preprocess != "False":
+        progress(stage="preprocessing")
+
+        with trace.span("preprocess") as span:
+            dataset = dataset_cache.get(preprocessed_dataset_path(ds_number, ds_filename, fs))
+            gestures, class_map = select_data(dataset, selected_gestures, channels)
+            span["samples"] = samples_count(gestures)
+
+        with trace.span("segment", samples=span["samples"]):
+            rest_avg_rms = np.mean([compute_rms(iter) for iter in gestures[0]], axis=0)
+
+            # rest trials are kept whole
+            gestures = crop_segments(gestures, segment_gestures(gestures, rest_avg_rms), keep=[0])
+    else:
+        with trace.span("load") as span:
+            gestures, class_map = get_data(ds_number, selected_gestures, channels, ds_filename)
+            span["samples"] = samples_count(gestures)
+
+    # identifies the gesture data, so rankings and the sweep share the cached window RMS
+    feature_key = (
+        dataset_cache.digest(dataset_path(ds_number, ds_filename)),
+        tuple(selected_gestures),
+        tuple(channels),
+        ds_number == 0 and apply_preprocess != "False",
+        fs,
+    )
+
+    progress(stage="ranking", metric=metric)
+
+    n_channels = gestures[0][0].shape[1]
+
+    with trace.span("ranking", samples=samples_count(gestures), channels=n_channels):
+        electrodes_sorted = ranking_metrics.plugin(metric).fn(classifier, gestures, cache_key=feature_key)
+
+    if params["search"] not in ("prefix", "halving"):
+        progress(stage="search", mode=params["search"])
+
+        # grow subsets from the top ranked channel, within the area and up to the requested channel count
+        with trace.span("search", mode=params["search"]):
+            best_model, best_channels, best_accuracy, best_f1, best_cm = search_channels(
+                gestures, classifier, mode=params["search"], max_channels=no_of_channels or SEARCH_MAX_CHANNELS,
+                start=electrodes_sorted[-1:], cache_key=feature_key, budget=params["search_budget"],
+                refit_final=True, progress=progress, trace=trace)
+    else:
+        if (no_of_channels != 0 and not optimize_further) or (no_of_channels != 0 and len(area_no_of_channels) == 0):
+            electrodes_sorted = electrodes_sorted[-no_of_channels:]
+        
+        optimize_further = optimize_further or (no_of_channels == 0 and len(area_no_of_channels) == 0)
+
+        progress(stage="sweep")
+
+        with trace.span("sweep"):
+            best_model, best_channels, best_accuracy, best_f1, best_cm = train_model(
+                electrodes_sorted, gestures, optimize_further, classifier, cache_key=feature_key, progress=progress,
+                refit_final=True, trace=trace, sweep="halving" if params["search"] == "halving" else "exhaustive",
+                budget=params["search_budget"])
+
+    best_channels = np.asarray(best_channels)
+
+    if len(channels):
+        channel_map = {
+            i: v for i, v in enumerate(channels) 
+        }
+        best_channels = np.array([channel_map[channel] for channel in best_channels])
     
-    return {"filename": file.filename, "message": "File uploaded successfully"}
+    # best_channels += 1
+
+    with trace.span("store"):
+        model_registry.put(params["model_id"], {
+            "model": best_model,
+            "channels": best_channels.tolist(),
+            "classes": list(class_map.keys()),
+            "n_windows": 3,
+            # features were computed over thirds of whole trials
+            "window_len": int(np.median([len(sample) for samples in gestures.values() for sample in samples]) // 3),
+            # trials were filtered at fs before the features were computed, live frames must be too
+            "fs": fs,
+            "apply_preprocess": ds_number == 0 and apply_preprocess != "False",
+        }, classifier=classifier, metric=metric, accuracy=float(best_accuracy), f1=float(best_f1))
+
+    # cache counters are process wide, concurrent jobs share them
+    trace.write(seconds=round(time.monotonic() - trace.started, 4), channels=n_channels,
+                best_channels=best_channels.tolist(), accuracy=float(best_accuracy),
+                caches={name: {k: v - cache_counts[name][k] for k, v in counts.items()}
+                        for name, counts in cache_stats().items()})
+
+    return {"best_channels": best_channels.tolist(), "accuracy": round(float(best_accuracy) * 100, 2), "f1": float(best_f1), "cm": best_cm.tolist(), "model_id": params["model_id"]}
+
+async def wait_for_disconnect(websocket):
+    """Return once the client of websocket disconnects; other messages are ignored."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
 
 @app.websocket("/ws/train_model")
 async def ws_train_model(websocket: WebSocket):
@@ -669,17 +2688,21 @@ async def ws_train_model(websocket: WebSocket):
     data = await websocket.receive_json()
 
     ds = data.get("ds", 0) # selected dataset (mandatory)
-    ds_number = ds_mapping[ds] # map dataset name to number
+    ds_number = ds_mapping.get(ds, 0) # map dataset name to number, anything else is a custom dataset
     selected_gestures = data.get("selected_gestures", []) # array of gesture numbers from the dataset
     no_of_channels = data.get("no_of_channels", 0) # maximum number of channels
     no_of_channels = int(no_of_channels)
-    classifier = data.get("classifier", "Random Forest") # selected classifier
-    metric = data.get("metric", "Mutual Information") # selected metric
+    classifier = classifiers.resolve(data.get("classifier", "Random Forest")) # selected classifier
+    metric = ranking_metrics.resolve(data.get("metric", "Mutual Information")) # selected metric
     area_no_of_channels = data.get("area_no_of_channels", []) # channels in the selected region 
     fs = data.get("fs", 0) # sampling frequency of custom dataset (mandatory, if ds_number == 0)
     apply_preprocess = data.get("apply_preprocess", True) # apply preprocessing for custom dataset 
-    ds_filename = data.get('ds_filename', None) # custom dataset file (mandatory, if ds_number == 0)
+    content_id = data.get('content_id', None) # content_id returned by /upload (mandatory, if ds_number == 0)
+    ds_filename = f"{content_id}.pkl" if content_id else data.get('ds_filename', None) # or the custom dataset file
+    ds_filename = os.path.basename(ds_filename) if ds_filename else None
     optimize_further = data.get("optimize_toggle", False) # optimize further (optional)
+    search = data.get("search", "prefix") # channel subset search: prefix, halving, forward, floating or beam (optional)
+    search_budget = data.get("search_budget", None) # wall-clock budget of the search or halving sweep in seconds (optional)
 
     error_msg = ""
 
@@ -688,55 +2711,437 @@ async def ws_train_model(websocket: WebSocket):
             error_msg = "sampling rate missing!"
         if not ds_filename:
             error_msg = "filename missing!"
+        elif not os.path.exists(dataset_path(ds_number, ds_filename)):
+            error_msg = "dataset not found, upload it first!"
+
+    if search not in SEARCH_MODES:
+        error_msg = f"unknown search mode, use one of {', '.join(SEARCH_MODES)}"
 
     if len(error_msg):
+        metrics.inc("sparseemg_training_requests_total", outcome="invalid")
         await websocket.send_json({"error": error_msg})
         await websocket.close()
+        return
 
     if len(area_no_of_channels):
         channels = [int(channel) - 1 for channel in area_no_of_channels]
     else:
         channels = []
-    
-    gestures, class_map = get_data(ds_number, selected_gestures, channels, ds_filename)
 
-    if ds_number == 0 and apply_preprocess != "False":
-        for sample in gestures[0]:
-            sample = preprocess(sample, fs)
-        
-        rest_avg_rms = np.mean([compute_rms(iter) for iter in gestures[0]], axis=0)
-
-        for g in gestures.keys():
-            for sample in gestures[g]:
-                sample = preprocess(sample, fs)
-                if g != 0:
-                    start, end = segment_gesture(sample, rest_avg_rms)
-                    sample = sample[start:end]
-
-    if metric == "RMS":
-        electrodes_sorted = calculate_rms_rankings(gestures)
-    elif metric == "Mutual Information":
-        electrodes_sorted = calculate_tmi_rankings(no_of_channels, gestures)
-    elif metric == "SHAP": 
-        electrodes_sorted = calculate_shap_rankings(classifier, gestures)
-    else:
-        electrodes_sorted = calculate_pi_rankings(classifier, gestures)
+    params = {
+        "ds_number": ds_number,
+        "ds_filename": ds_filename,
+        "selected_gestures": selected_gestures,
+        "channels": channels,
+        "fs": fs,
+        "apply_preprocess": apply_preprocess,
+        "classifier": classifier,
+        "metric": metric,
+        "no_of_channels": no_of_channels,
+        "area_no_of_channels": area_no_of_channels,
+        "optimize_further": optimize_further,
+        "search": search,
+        "search_budget": search_budget,
+    }
 
-    if (no_of_channels != 0 and not optimize_further) or (no_of_channels != 0 and len(area_no_of_channels) == 0):
-        electrodes_sorted = electrodes_sorted[-no_of_channels:]
-    
-    optimize_further = optimize_further or (no_of_channels == 0 and len(area_no_of_channels) == 0)
+    digest = await asyncio.to_thread(dataset_cache.digest, dataset_path(ds_number, ds_filename))
 
-    best_model, best_channels, best_accuracy, best_f1, best_cm = train_model(electrodes_sorted, gestures, optimize_further, classifier)
+    # the trained layout is stored under the request hash for /ws/classify
+    params["model_id"] = training_key(params, digest)
 
-    if len(channels):
-        channel_map = {
-            i: v for i, v in enumerate(channels) 
-        }
-        best_channels = np.array([channel_map[channel] for channel in best_channels])
-    
-    # best_channels += 1
+    started = time.monotonic()
+    trained = []
+
+    def job(progress):
+        trained.append(True)
+        return run_training(params, progress)
+
+    training = asyncio.ensure_future(cached_training(params["model_id"], job, websocket.send_json))
+    disconnected = asyncio.ensure_future(wait_for_disconnect(websocket))
+
+    await asyncio.wait({training, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+
+    if not training.done():
+        # nobody is left to send the result to, free the slot and the workers
+        training.cancel()
+        await asyncio.wait({training})
+        metrics.inc("sparseemg_training_requests_total", outcome="disconnected")
+        return
+
+    disconnected.cancel()
+
+    try:
+        result = training.result()
+    except JobQueueFull:
+        metrics.inc("sparseemg_training_requests_total", outcome="busy")
+        await websocket.send_json({"error": "server busy, please try again later"})
+        await websocket.close()
+        return
+    except Exception:
+        metrics.inc("sparseemg_training_requests_total", outcome="error")
+        raise
+
+    outcome = "trained" if trained else "cached"
+    metrics.inc("sparseemg_training_requests_total", outcome=outcome)
+    metrics.observe("sparseemg_training_request_seconds", time.monotonic() - started, outcome=outcome)
 
-    await websocket.send_json({"best_channels": best_channels.tolist(), "accuracy": round(float(best_accuracy) * 100, 2), "f1": float(best_f1), "cm": best_cm.tolist()})
+    await websocket.send_json(result)
 
     await websocket.close()
+
+MODEL_DIR = os.environ.get("SPARSEEMG_MODEL_DIR", "cache/models")
+MAX_HOT_MODELS = int(os.environ.get("SPARSEEMG_MAX_HOT_MODELS", 16))
+
+class ModelRegistry:
+    """
+    Persistent registry of trained layouts, one directory per model id (the training request hash).
+
+    Every entry holds meta.json (best_channels, class order, feature and preprocessing config,
+    metrics) and the
+    fitted classifier: XGBoost models in their native UBJSON format, other models as an
+    uncompressed joblib file that is memory-mapped on load. Models are loaded lazily on first
+    use and the most recently used ones are kept in memory.
+    """
+
+    def __init__(self, path=MODEL_DIR, max_hot=MAX_HOT_MODELS):
+        self.path = path
+        self.max_hot = max_hot
+        self.hits = 0
+        self.misses = 0
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, model_id):
+        # model ids are hex digests, anything else must not escape the registry directory
+        if not isinstance(model_id, str) or not model_id or not all(c in "0123456789abcdefABCDEF-_" for c in model_id):
+            raise KeyError(model_id)
+        return os.path.join(self.path, model_id)
+
+    def put(self, model_id, layout, **info):
+        """Store a layout dict {model, channels, classes, n_windows, window_len, fs, apply_preprocess} with extra metadata."""
+        path = self._dir(model_id)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        model = layout["model"]
+
+        if is_xgboost_model(model):
+            model_file = "model.ubj"
+            model.save_model(os.path.join(tmp_path, model_file))
+        else:
+            model_file = "model.joblib"
+            joblib.dump(model, os.path.join(tmp_path, model_file))
+
+        meta = {key: value for key, value in layout.items() if key != "model"}
+        meta.update(info, model_id=model_id, model_file=model_file, created=time.time())
+
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+        self._remember(model_id, layout)
+
+    def get(self, model_id):
+        """Return the layout dict of a model, loading it from disk if it is not in memory, or None."""
+        if not isinstance(model_id, str):
+            # ids from clients may be any JSON value, e.g. unhashable lists
+            return None
+
+        with self._lock:
+            if model_id in self._hot:
+                self._hot.move_to_end(model_id)
+                self.hits += 1
+                return self._hot[model_id]
+
+        meta = self.meta(model_id)
+        if meta is None:
+            return None
+
+        model_path = os.path.join(self._dir(model_id), meta["model_file"])
+
+        if meta["model_file"].endswith(".ubj"):
+            import xgboost as xgb
+            model = xgb.XGBClassifier()
+            model.load_model(model_path)
+        else:
+            model = joblib.load(model_path, mmap_mode='r')
+
+        layout = {key: meta[key] for key in ("channels", "classes", "n_windows", "window_len")}
+        # layouts stored before the preprocessing was recorded are classified on raw frames
+        layout["fs"] = meta.get("fs")
+        layout["apply_preprocess"] = meta.get("apply_preprocess", False)
+        layout["model"] = model
+
+        with self._lock:
+            self.misses += 1
+        self._remember(model_id, layout)
+
+        return layout
+
+    def meta(self, model_id):
+        try:
+            with open(os.path.join(self._dir(model_id), "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def list(self):
+        models = [self.meta(entry.name) for entry in os.scandir(self.path) if entry.is_dir() and ".tmp-" not in entry.name]
+        return sorted([meta for meta in models if meta is not None], key=lambda meta: meta["created"], reverse=True)
+
+    def delete(self, model_id):
+        """Remove a model from disk and memory, return False if it did not exist."""
+        with self._lock:
+            self._hot.pop(model_id, None)
+
+        if self.meta(model_id) is None:
+            return False
+
+        shutil.rmtree(self._dir(model_id), ignore_errors=True)
+        return True
+
+    def _remember(self, model_id, layout):
+        with self._lock:
+            self._hot[model_id] = layout
+            self._hot.move_to_end(model_id)
+            while len(self._hot) > self.max_hot:
+                self._hot.popitem(last=False)
+
+model_registry = ModelRegistry()
+
+@app.get("/models")
+def list_models():
+    return {"models": model_registry.list()}
+
+@app.get("/models/{model_id}")
+def get_model(model_id: str):
+    meta = model_registry.meta(model_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    return meta
+
+@app.delete("/models/{model_id}")
+def delete_model(model_id: str):
+    if not model_registry.delete(model_id):
+        raise HTTPException(status_code=404, detail="Model not found")
+    return {"model_id": model_id, "message": "Model deleted successfully"}
+
+def cache_stats():
+    """Hit and miss counters of every cache."""
+    caches = {"dataset": dataset_cache, "features": feature_cache, "results": result_store, "models": model_registry}
+    stats = {name: {"hits": cache.hits, "misses": cache.misses} for name, cache in caches.items()}
+    stencils = render_stencil.cache_info()
+    stats["stencils"] = {"hits": stencils.hits, "misses": stencils.misses}
+    return stats
+
+@metrics.collect
+def collect_server_metrics(registry):
+    for name, counts in cache_stats().items():
+        registry.set("sparseemg_cache_hits_total", counts["hits"], cache=name)
+        registry.set("sparseemg_cache_misses_total", counts["misses"], cache=name)
+        registry.set("sparseemg_cache_hit_ratio", counts["hits"] / max(counts["hits"] + counts["misses"], 1), cache=name)
+
+    registry.set("sparseemg_jobs", scheduler.running, state="running")
+    registry.set("sparseemg_jobs", len(scheduler.waiting), state="queued")
+    registry.set("sparseemg_peak_rss_bytes", peak_rss())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+class StreamingWindowRMS:
+    """
+    Per-channel RMS of n_windows consecutive windows over the most recent samples of a stream.
+
+    Squared samples are kept in a ring buffer and the sum of every window is updated with the
+    samples that enter, move between and leave the windows, so pushing a frame costs time
+    proportional to the frame, not to the windows.
+    """
+
+    def __init__(self, n_channels, window_len, n_windows=3):
+        self.window_len = window_len
+        self.n_windows = n_windows
+        self.squared = np.zeros((n_windows * window_len, n_channels))
+        self.sums = np.zeros((n_windows, n_channels))
+        self.head = 0
+        self.count = 0
+
+    @property
+    def ready(self):
+        """True once every window has been filled."""
+        return self.count >= len(self.squared)
+
+    def _take(self, start, n):
+        return self.squared[(start + np.arange(n)) % len(self.squared)]
+
+    def push(self, frame):
+        """Append a (samples, channels) frame."""
+        for i in range(0, len(frame), self.window_len):
+            self._push(np.square(frame[i:i + self.window_len]))
+
+    def _push(self, squared):
+        n = len(squared)
+
+        # window k ends k windows before the newest window, samples cross its boundary into window k - 1
+        for k in range(1, self.n_windows):
+            moving = self._take(self.head - k * self.window_len, n).sum(axis=0)
+            self.sums[self.n_windows - k] -= moving
+            self.sums[self.n_windows - k - 1] += moving
+
+        # the oldest samples are about to be overwritten
+        self.sums[0] -= self._take(self.head, n).sum(axis=0)
+        self.sums[-1] += squared.sum(axis=0)
+
+        index = (self.head + np.arange(n)) % len(self.squared)
+        self.squared[index] = squared
+        self.head = (self.head + n) % len(self.squared)
+
+        previous_count = self.count
+        self.count += n
+
+        # recompute the sums exactly once per buffer length to stop rounding errors from accumulating
+        if previous_count // len(self.squared) != self.count // len(self.squared):
+            ordered = np.roll(self.squared, -self.head, axis=0)
+            self.sums = ordered.reshape(self.n_windows, self.window_len, -1).sum(axis=1)
+
+    def rms(self):
+        """RMS of every channel in every window, shape (n_windows, channels), oldest window first."""
+        return np.sqrt(np.maximum(self.sums, 0) / self.window_len)
+
+class StreamingFilter:
+    """
+    Causal counterpart of the zero-phase preprocessing filter for a stream of frames.
+
+    sosfiltfilt runs the cascade forwards and backwards over a whole trial; a stream can only
+    be filtered forwards, so the cascade is run twice, which has the same magnitude response
+    delayed instead of zero phase. The state of both passes is kept from frame to frame.
+    """
+
+    def __init__(self, sos, n_channels, passes=2):
+        self.sos = sos
+        self.state = [np.zeros((len(sos), 2, n_channels)) for _ in range(passes)]
+
+    def push(self, frame):
+        """Filter a (samples, channels) frame and return it."""
+        from scipy.signal import sosfilt
+
+        for i, state in enumerate(self.state):
+            frame, self.state[i] = sosfilt(self.sos, frame, axis=0, zi=state)
+        return frame
+
+class LayoutClassifier:
+    """
+    Classifies a stream of EMG frames of the channels of a trained layout with its fitted model.
+
+    Layouts trained on preprocessed trials filter the frames with the same cascade first.
+    """
+
+    def __init__(self, layout, window_len=None):
+        self.model = layout["model"]
+        self.classes = layout["classes"]
+        self.n_channels = len(layout["channels"])
+        self.rms = StreamingWindowRMS(self.n_channels, window_len or layout["window_len"], layout["n_windows"])
+        self.filter = StreamingFilter(filter_sos(layout["fs"]), self.n_channels) if layout.get("apply_preprocess") else None
+
+    def push(self, frame):
+        """Append a (samples, channels) frame and return the predicted gesture, None until the windows are filled."""
+        if self.filter is not None:
+            frame = self.filter.push(frame)
+
+        self.rms.push(frame)
+
+        if not self.rms.ready:
+            return None
+
+        features = normalize_window_rms(self.rms.rms()[None])
+
+        return self.classes[int(self.model.predict(features)[0])]
+
+def parse_frame(message, n_channels):
+    """Decode a frame sent as JSON {"frame": [[...], ...]} or as raw little-endian float32 bytes."""
+    if message.get("bytes") is not None:
+        return np.frombuffer(message["bytes"], dtype="<f4").reshape(-1, n_channels)
+    return np.asarray(json.loads(message["text"])["frame"], dtype=float).reshape(-1, n_channels)
+
+@app.websocket("/ws/classify")
+async def ws_classify(websocket: WebSocket):
+    """
+    Live classification with a layout trained through /ws/train_model.
+
+    The first message is {"model_id": ..., "window_len": optional samples per window}. Every
+    following message is a frame of raw samples of the layout's best_channels, in that order,
+    and is answered with the predicted gesture and the server-side latency. Layouts trained on
+    preprocessed uploads filter the frames as the trials were filtered, see LayoutClassifier.
+    """
+    await websocket.accept()
+
+    data = await websocket.receive_json()
+
+    layout = await asyncio.to_thread(model_registry.get, data.get("model_id"))
+
+    if layout is None:
+        await websocket.send_json({"error": "unknown model_id, train the layout first"})
+        await websocket.close()
+        return
+
+    window_len = data.get("window_len")
+
+    if window_len is not None and (type(window_len) is not int or window_len <= 0):
+        await websocket.send_json({"error": "window_len must be a positive number of samples"})
+        await websocket.close()
+        return
+
+    classifier = LayoutClassifier(layout, window_len)
+
+    # frames of preprocessed layouts must be sampled at the fs they were trained with
+    await websocket.send_json({"channels": layout["channels"], "window_len": classifier.rms.window_len,
+                               "fs": layout["fs"] if classifier.filter is not None else None})
+
+    while True:
+        message = await websocket.receive()
+
+        if message["type"] == "websocket.disconnect":
+            break
+
+        start = time.perf_counter()
+
+        try:
+            frame = parse_frame(message, classifier.n_channels)
+        except (ValueError, KeyError, TypeError):
+            await websocket.send_json({"error": "frame must hold a whole number of samples of the layout's channels"})
+            continue
+
+        # model inference stays off the event loop, other connections keep being served
+        prediction = await asyncio.to_thread(classifier.push, frame)
+
+        await websocket.send_json({
+            "prediction": None if prediction is None else int(prediction),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+        })
+
+PLUGIN_MODULES = [name.strip() for name in os.environ.get("SPARSEEMG_PLUGINS", "").split(",") if name.strip()]
+PRELOAD = [name.strip() for name in os.environ.get("SPARSEEMG_PRELOAD", "").split(",") if name.strip()]
+
+def load_plugins(modules=PLUGIN_MODULES, preload=PRELOAD):
+    """
+    Import plugin modules, which register further classifiers and metrics, then import the
+    dependencies of the preloaded plugins so the first request of a warm worker does not pay for them.
+
+    preload lists classifier and metric names or aliases, "all" preloads every plugin.
+    """
+    for module in modules:
+        importlib.import_module(module)
+
+    for name in preload:
+        registries = [registry for registry in (classifiers, ranking_metrics) if name == "all" or name in registry]
+        if not registries:
+            raise ValueError(f"unknown plugin to preload: {name}")
+        for registry in registries:
+            for plugin in (registry.plugins if name == "all" else [name]):
+                registry.preload(plugin)
+
+load_plugins()
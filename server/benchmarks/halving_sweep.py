@@ -0,0 +1,60 @@
+"""
+Compare the successive halving sweep of train_model with the exhaustive z sweep.
+
+Channels are ranked once with mutual information; then, for every classifier, z from 2 to
+20 is swept exhaustively and with sweep="halving", and the report shows the z each one
+chooses, the exhaustive CV accuracy of the z chosen by halving, the accuracy given up and
+the speedup. Bundled datasets (static/datasets/ds{n}_gestures.pkl) are used when available,
+otherwise a synthetic one. Run from the server directory:
+
+    python -m benchmarks.halving_sweep --dataset 1 --classifiers SVC XGB --budget 5
+"""
+import os
+import time
+import argparse
+
+from app import get_data, dataset_path, calculate_tmi_rankings, cross_validate_subsets, train_model, TRAIN_WORKERS
+from benchmarks.synthetic import synthetic_gestures
+
+def load_gestures(ds_number):
+    if os.path.exists(dataset_path(ds_number, None)):
+        gestures, _ = get_data(ds_number, [], [], None)
+        return gestures, f"ds{ds_number}"
+    return synthetic_gestures(n_channels=64, n_gestures=8, n_trials=12), "synthetic"
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=int, default=1)
+    parser.add_argument("--classifiers", nargs="+", default=["SVC", "Random Forest", "XGB"])
+    parser.add_argument("--budget", type=float, help="deadline of the halving sweep in seconds")
+    parser.add_argument("--workers", type=int, default=TRAIN_WORKERS)
+    args = parser.parse_args()
+
+    gestures, name = load_gestures(args.dataset)
+    ranking = calculate_tmi_rankings(gestures)
+    print(f"{name}: {gestures[0][0].shape[1]} channels, {len(gestures)} gestures, {args.workers} workers")
+
+    print(f"{'classifier':<20} {'exhaustive z':>12} {'accuracy':>9} {'s':>7} {'halving z':>10} {'accuracy':>9} "
+          f"{'given up':>9} {'s':>7} {'speedup':>8}")
+
+    for classifier in args.classifiers:
+        exhaustive_time, (_, exhaustive_channels, exhaustive_accuracy, _, _) = timed(
+            lambda: train_model(ranking, gestures, True, classifier, n_workers=args.workers))
+        halving_time, (_, halving_channels, _, _, _) = timed(
+            lambda: train_model(ranking, gestures, True, classifier, n_workers=args.workers, sweep="halving",
+                                budget=args.budget))
+
+        # the exhaustive sweep scores every z with the same folds, rescore the one halving chose
+        _, _, halving_accuracy, _, _ = cross_validate_subsets([halving_channels], gestures, classifier, n_workers=args.workers)
+
+        print(f"{classifier:<20} {len(exhaustive_channels):>12} {exhaustive_accuracy:>9.2%} {exhaustive_time:>7.2f} "
+              f"{len(halving_channels):>10} {halving_accuracy:>9.2%} {exhaustive_accuracy - halving_accuracy:>9.2%} "
+              f"{halving_time:>7.2f} {exhaustive_time / halving_time:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Time and memory of every pipeline stage on synthetic datasets shaped like the bundled ones.
+
+For every datasets/*/dataset_metadata*.json a synthetic recording with the same number of
+electrodes and gestures is generated at each scale (trials per gesture = --trials x scale),
+written as a pickle and as a columnar dataset, and pushed through loading, feature extraction,
+the four rankings, the channel sweep, preprocessing, segmentation and stencil generation.
+Every stage reports the best wall time of --repeat runs and the peak traced allocation of
+one extra run. Run from the server directory:
+
+    python -m benchmarks.pipeline --datasets putEMG DELTA --scales 0.5 1 --output results.json
+    python -m benchmarks.pipeline --baseline results.json
+
+With --baseline the results are compared stage by stage with a stored run; the exit code is
+1 when a stage got slower or larger than --tolerance allows, so it can gate a CI job.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import pickle
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+from app import (dataset_cache, convert_to_columnar, columnar_path, select_data, calculate_features,
+                 calculate_rms_rankings, calculate_tmi_rankings, calculate_pi_rankings,
+                 calculate_shap_rankings, train_model, preprocess_trials, compute_rms,
+                 segment_gestures, electrode_grid, stencil_layout, render_svg, render_pdf)
+from benchmarks.synthetic import dataset_shapes, synthetic_dataset
+
+STAGES = ("load_pickle", "load_columnar", "features", "rms_rankings", "tmi_rankings", "pi_rankings",
+          "shap_rankings", "train_model", "preprocess", "segment", "stencil_svg", "stencil_pdf")
+
+def measure(fn, repeat):
+    """Best wall time of repeat calls, then peak traced memory of one more call; returns (seconds, peak bytes, result)."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(times), peak, result
+
+def stage_functions(workdir, name, raw, classifier, fs):
+    """Build the stage callables; stages read the outputs of earlier stages from the state dict."""
+    pickle_path = os.path.join(workdir, "static", "datasets", "ds1_gestures.pkl")
+    with open(pickle_path, "wb") as f:
+        pickle.dump(raw, f)
+    convert_to_columnar(raw, columnar_path(pickle_path))
+
+    state = {}
+
+    def load(path):
+        dataset_cache.invalidate(path)
+        state["gestures"], _ = select_data(dataset_cache.get(path), [], [])
+        return state["gestures"]
+
+    def segment():
+        rest_rms = np.mean([compute_rms(sample) for sample in state["filtered"][0]], axis=0)
+        return [segment_gestures(state["filtered"][g], rest_rms) for g in state["filtered"] if g != 0]
+
+    def preprocess():
+        gestures = state["gestures"]
+        trials = iter(preprocess_trials([sample for g in gestures for sample in gestures[g]], fs))
+        state["filtered"] = {g: [next(trials) for _ in gestures[g]] for g in gestures}
+        return state["filtered"]
+
+    def rank():
+        state["ranking"] = calculate_tmi_rankings(state["gestures"])
+        return state["ranking"]
+
+    n_channels = raw[min(raw)][0].shape[1]
+    n_rows, n_cols = electrode_grid(name)
+
+    def layout():
+        # stencils are cached by the app, lay them out uncached
+        return stencil_layout.__wrapped__(n_rows, n_cols, (25.0,) * n_rows, tuple(range(1, n_channels + 1, 3)))
+
+    return {
+        "load_pickle": lambda: load(pickle_path),
+        "load_columnar": lambda: load(columnar_path(pickle_path)),
+        "features": lambda: calculate_features(state["gestures"]),
+        "rms_rankings": lambda: calculate_rms_rankings(state["gestures"]),
+        "tmi_rankings": rank,
+        "pi_rankings": lambda: calculate_pi_rankings(classifier, state["gestures"], n_workers=1),
+        "shap_rankings": lambda: calculate_shap_rankings(classifier, state["gestures"], n_workers=1),
+        "train_model": lambda: train_model(state["ranking"], state["gestures"], True, classifier, n_workers=1),
+        "preprocess": preprocess,
+        "segment": segment,
+        "stencil_svg": lambda: render_svg(layout()),
+        "stencil_pdf": lambda: render_pdf([layout()]),
+    }
+
+def run(args):
+    shapes = dataset_shapes(args.metadata)
+    names = [name for name in shapes if not args.datasets or name in args.datasets]
+    stages = [stage for stage in STAGES if stage in args.stages]
+    results = []
+
+    cwd = os.getcwd()
+
+    for name in names:
+        n_channels, gesture_ids = shapes[name]
+
+        for scale in args.scales:
+            # at least one trial per CV fold
+            n_trials = max(4, int(round(args.trials * scale)))
+            raw = synthetic_dataset(n_channels, gesture_ids, n_trials, args.samples)
+
+            with tempfile.TemporaryDirectory() as workdir:
+                os.makedirs(os.path.join(workdir, "static", "datasets"))
+                # stages use the app's relative paths (static/, cache/), keep them out of the tree
+                os.chdir(workdir)
+                try:
+                    functions = stage_functions(workdir, name, raw, args.classifier, args.fs)
+                    # later stages need the loaded gestures, the ranking and the filtered trials
+                    for stage in ("load_pickle", "tmi_rankings", "preprocess"):
+                        functions[stage]()
+
+                    for stage in stages:
+                        seconds, peak, _ = measure(functions[stage], args.repeat)
+                        results.append({
+                            "dataset": name, "scale": scale, "stage": stage,
+                            "channels": n_channels, "gestures": len(gesture_ids), "trials": n_trials,
+                            "seconds": seconds, "peak_bytes": peak,
+                        })
+                        print(f"{name:<16} {scale:>6g} {stage:<14} {seconds:>10.4f} s {peak / 2**20:>10.1f} MiB", flush=True)
+                finally:
+                    os.chdir(cwd)
+                    dataset_cache.invalidate()
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "parameters": {
+            "classifier": args.classifier, "trials": args.trials, "samples": args.samples,
+            "fs": args.fs, "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+def compare(report, baseline, tolerance, min_seconds):
+    """Print the ratio of every stage to the baseline and return the stages that regressed."""
+    reference = {(r["dataset"], r["scale"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+
+    print(f"\n{'dataset':<16} {'scale':>6} {'stage':<14} {'time':>8} {'memory':>8}")
+
+    for result in report["results"]:
+        key = (result["dataset"], result["scale"], result["stage"])
+        if key not in reference:
+            continue
+        before = reference[key]
+
+        time_ratio = result["seconds"] / max(before["seconds"], 1e-9)
+        memory_ratio = result["peak_bytes"] / max(before["peak_bytes"], 1)
+
+        # differences below min_seconds or 1 MiB are noise on short stages
+        slower = time_ratio > 1 + tolerance and result["seconds"] - before["seconds"] > min_seconds
+        larger = memory_ratio > 1 + tolerance and result["peak_bytes"] - before["peak_bytes"] > 2**20
+
+        flag = " REGRESSION" if slower or larger else ""
+        print(f"{key[0]:<16} {key[1]:>6g} {key[2]:<14} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{flag}")
+
+        if flag:
+            regressions.append(key)
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metadata", default="../datasets", help="directory searched for dataset_metadata*.json")
+    parser.add_argument("--datasets", nargs="+", help="dataset names, default all")
+    parser.add_argument("--scales", nargs="+", type=float, default=[0.5, 1.0])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--trials", type=int, default=10, help="trials per gesture at scale 1")
+    parser.add_argument("--samples", type=int, default=1000, help="samples per trial")
+    parser.add_argument("--fs", type=int, default=2000)
+    parser.add_argument("--classifier", default="Naive Bayes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with a JSON file written by --output")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown or growth")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="ignore slowdowns below this many seconds")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
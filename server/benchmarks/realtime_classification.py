@@ -0,0 +1,113 @@
+"""
+Latency and throughput of live classification with a trained sparse layout.
+
+A layout is trained on a bundled dataset (static/datasets/ds{n}_gestures.pkl, or a synthetic
+dataset when it is not available), then the recording is replayed frame by frame through
+LayoutClassifier, in process or through /ws/classify. Run from the server directory:
+
+    python -m benchmarks.realtime_classification --dataset 2 --frame 20
+"""
+import os
+import time
+import uuid
+import argparse
+import numpy as np
+
+from app import (get_data, dataset_path, calculate_tmi_rankings, train_model, LayoutClassifier,
+                 model_registry, app)
+from benchmarks.synthetic import synthetic_gestures
+
+def load_gestures(ds_number):
+    if os.path.exists(dataset_path(ds_number, None)):
+        gestures, _ = get_data(ds_number, [], [], None)
+        return gestures, f"ds{ds_number}"
+    return synthetic_gestures(n_channels=32, n_gestures=6, n_trials=12), "synthetic"
+
+def train_layout(gestures, channels, classifier):
+    ranking = calculate_tmi_rankings(gestures)[-channels:]
+    model, best_channels, accuracy, _, _ = train_model(ranking, gestures, False, classifier, n_workers=1, refit_final=True)
+    lengths = [len(sample) for samples in gestures.values() for sample in samples]
+    layout = {
+        "model": model,
+        "channels": np.asarray(best_channels).tolist(),
+        "classes": list(gestures.keys()),
+        "n_windows": 3,
+        "window_len": int(np.median(lengths) // 3),
+    }
+    return layout, accuracy
+
+def replay(gestures, layout):
+    """Concatenate one trial of every gesture after another and return the recording and its labels."""
+    recording, labels = [], []
+    for trial in range(min(len(samples) for samples in gestures.values())):
+        for g, samples in gestures.items():
+            recording.append(np.asarray(samples[trial])[:, layout["channels"]])
+            labels.append(np.full(len(samples[trial]), g))
+    return np.concatenate(recording).astype(np.float32), np.concatenate(labels)
+
+def summarize(name, latencies, n_samples, elapsed):
+    latencies = np.array(latencies) * 1000
+    print(f"{name:<12} frames {len(latencies):>7}  p50 {np.percentile(latencies, 50):7.3f} ms  "
+          f"p99 {np.percentile(latencies, 99):7.3f} ms  max {latencies.max():7.3f} ms  "
+          f"{n_samples / elapsed:12.0f} samples/s")
+
+def bench_in_process(layout, recording, labels, frame):
+    classifier = LayoutClassifier(layout)
+    latencies, correct, predicted = [], 0, 0
+
+    start = time.perf_counter()
+    for i in range(0, len(recording), frame):
+        t = time.perf_counter()
+        prediction = classifier.push(recording[i:i + frame])
+        latencies.append(time.perf_counter() - t)
+        if prediction is not None:
+            predicted += 1
+            correct += prediction == labels[min(i + frame, len(labels)) - 1]
+    summarize("in-process", latencies, len(recording), time.perf_counter() - start)
+    print(f"{'':<12} frame-level agreement with the replayed gesture: {correct / max(predicted, 1):.2%}")
+
+def bench_websocket(layout, recording, frame):
+    from fastapi.testclient import TestClient
+
+    # model ids are hex digests, like the training request hashes
+    model_id = uuid.uuid4().hex
+    model_registry.put(model_id, layout)
+    client = TestClient(app)
+    latencies = []
+
+    with client.websocket_connect("/ws/classify") as ws:
+        ws.send_json({"model_id": model_id})
+        ws.receive_json()
+
+        start = time.perf_counter()
+        for i in range(0, len(recording), frame):
+            t = time.perf_counter()
+            ws.send_bytes(recording[i:i + frame].astype("<f4").tobytes())
+            ws.receive_json()
+            latencies.append(time.perf_counter() - t)
+        summarize("websocket", latencies, len(recording), time.perf_counter() - start)
+
+    model_registry.delete(model_id)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=int, default=2)
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--classifier", default="Random Forest")
+    parser.add_argument("--frame", type=int, default=20, help="samples per pushed frame")
+    parser.add_argument("--websocket", action="store_true", help="also replay through /ws/classify")
+    args = parser.parse_args()
+
+    gestures, name = load_gestures(args.dataset)
+    layout, accuracy = train_layout(gestures, args.channels, args.classifier)
+    recording, labels = replay(gestures, layout)
+
+    print(f"{name}: {len(layout['channels'])} channels, {args.classifier}, CV accuracy {accuracy:.2%}, "
+          f"window {layout['window_len']} samples, frame {args.frame} samples")
+
+    bench_in_process(layout, recording, labels, args.frame)
+    if args.websocket:
+        bench_websocket(layout, recording, args.frame)
+
+if __name__ == "__main__":
+    main()
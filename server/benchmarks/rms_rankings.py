@@ -0,0 +1,75 @@
+"""
+Compare calculate_rms_rankings with the per-trial loop it replaced.
+
+The reference below is the former implementation: rest statistics and normalized RMS
+computed trial by trial, and the consensus of the per-gesture rankings built from
+dictionaries of item positions. Both must return the same channel order. Run from the
+server directory:
+
+    python -m benchmarks.rms_rankings --channels 192 --gestures 8 16 32
+"""
+import time
+import argparse
+import numpy as np
+
+from app import calculate_rms_rankings
+from benchmarks.synthetic import synthetic_gestures
+
+def reference_rms_rankings(gestures):
+    rest_means = np.array([np.mean(rest, axis=0) for rest in gestures[0]])
+    rest_arv = np.array([np.mean(np.abs(rest), axis=0) for rest in gestures[0]])
+    rest_mean_global = np.mean(rest_means, axis=0)
+    rest_arv_global = np.mean(rest_arv, axis=0)
+
+    rankings = []
+    for g in gestures.keys():
+        cleaned = [(sample - rest_mean_global) / (rest_arv_global + 1e-8) for sample in gestures[g]]
+        rms = np.array([np.sqrt(np.mean(np.square(sample), axis=0)) for sample in cleaned]).mean(axis=0)
+        rankings.append(np.argsort(rms))
+
+    # every channel is in every ranking, so the intersection keeps all of them in ascending order
+    positions = {}
+    for ranking in rankings:
+        for item in np.unique(ranking):
+            positions.setdefault(item, []).append(np.where(ranking == item)[0][0])
+
+    frequent = {}
+    for item, indices in positions.items():
+        counts = {}
+        for idx in indices:
+            counts[idx] = counts.get(idx, 0) + 1
+        frequent[item] = max(counts, key=counts.get)
+
+    return [item for item, _ in sorted(frequent.items(), key=lambda x: x[1])]
+
+def best_time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=192)
+    parser.add_argument("--gestures", nargs="+", type=int, default=[8, 16, 32], help="gestures including rest")
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'channels':>8} {'gestures':>8} {'reference s':>12} {'vectorized s':>13} {'speedup':>8} {'identical':>10}")
+
+    for n_gestures in args.gestures:
+        gestures = synthetic_gestures(args.channels, n_gestures, args.trials, args.samples)
+
+        reference_time, reference = best_time(lambda: reference_rms_rankings(gestures), args.repeat)
+        vectorized_time, ranking = best_time(lambda: calculate_rms_rankings(gestures), args.repeat)
+
+        identical = np.array_equal(reference, ranking)
+        print(f"{args.channels:>8} {n_gestures:>8} {reference_time:>12.3f} {vectorized_time:>13.3f} "
+              f"{reference_time / vectorized_time:>8.1f} {str(identical):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare the SHAP ranking paths of calculate_shap_rankings.
+
+The reference is the exhaustive KernelExplainer path (k-means background of 50, shap's
+default number of samples, every held-out sample, one fold after another). Run from the
+server directory:
+
+    python -m benchmarks.shap_rankings --channels 16 --trials 10
+"""
+import time
+import argparse
+import numpy as np
+from scipy.stats import spearmanr
+
+from app import calculate_shap_rankings, TRAIN_WORKERS
+from benchmarks.synthetic import synthetic_gestures
+
+def ranking_agreement(reference, ranking):
+    """Spearman correlation of the channel positions and overlap of the top quarter of channels."""
+    top = max(1, len(reference) // 4)
+    positions_reference = np.argsort(reference)
+    positions = np.argsort(ranking)
+    rho = spearmanr(positions_reference, positions)[0]
+    overlap = len(set(reference[-top:]) & set(ranking[-top:])) / top
+    return rho, overlap
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=16)
+    parser.add_argument("--gestures", type=int, default=5)
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=TRAIN_WORKERS)
+    parser.add_argument("--classifiers", nargs="+", default=["Random Forest", "XGB", "Logistic Regression", "KNN"])
+    args = parser.parse_args()
+
+    gestures = synthetic_gestures(args.channels, args.gestures, args.trials, args.samples)
+
+    print(f"{'classifier':<20} {'reference s':>12} {'fast s':>8} {'speedup':>8} {'spearman':>9} {'top-25%':>8}")
+
+    for model_name in args.classifiers:
+        start = time.perf_counter()
+        reference = calculate_shap_rankings(model_name, gestures, explainer="kernel", n_workers=1,
+                                            nsamples="auto", max_explained=None)
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ranking = calculate_shap_rankings(model_name, gestures, n_workers=args.workers)
+        fast_time = time.perf_counter() - start
+
+        rho, overlap = ranking_agreement(reference, ranking)
+
+        print(f"{model_name:<20} {reference_time:>12.2f} {fast_time:>8.2f} {reference_time / fast_time:>8.1f} {rho:>9.3f} {overlap:>8.2f}")
+
+if __name__ == "__main__":
+    main()
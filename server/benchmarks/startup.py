@@ -0,0 +1,71 @@
+"""
+Cold-start cost of a server worker: importing app, optionally preloading plugins, and the
+first training request of a classifier and ranking metric.
+
+Every scenario runs in a fresh interpreter, like a new uvicorn worker, and reports the
+median over --repeat runs of the import time, the time of the first ranking and sweep on a
+small synthetic dataset, the peak RSS and which heavy dependencies ended up imported. Run
+from the server directory:
+
+    python -m benchmarks.startup --requests "Random Forest:RMS" "XGB:SHAP" --preload "" all
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+
+HEAVY_MODULES = ("sklearn", "scipy.signal", "xgboost", "shap", "reportlab")
+
+WORKER = """
+import sys, time, json, resource
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+request_seconds = None
+if {request!r}:
+    from benchmarks.synthetic import synthetic_gestures
+    classifier, metric = {request!r}.split(":")
+    gestures = synthetic_gestures(n_channels=16, n_gestures=4, n_trials=8, n_samples=600)
+    start = time.perf_counter()
+    ranking = app.ranking_metrics.plugin(metric).fn(classifier, gestures)
+    app.train_model(ranking[-4:], gestures, False, classifier, n_workers=1)
+    request_seconds = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": imported - started,
+    "request_seconds": request_seconds,
+    "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+def run_worker(request, preload):
+    env = dict(os.environ, SPARSEEMG_PRELOAD=preload, SPARSEEMG_TRAIN_WORKERS="1")
+    output = subprocess.run([sys.executable, "-c", WORKER.format(request=request, heavy=HEAVY_MODULES)],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", nargs="+", default=["", "Random Forest:RMS", "Random Forest:Mutual Information", "XGB:SHAP"],
+                        help='"classifier:metric" of the first request, "" for import only')
+    parser.add_argument("--preload", nargs="+", default=["", "all"], help="SPARSEEMG_PRELOAD values")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'preload':<10} {'first request':<34} {'import s':>9} {'request s':>10} {'RSS MiB':>8} {'modules':>8}  heavy")
+
+    for preload in args.preload:
+        for request in args.requests:
+            runs = [run_worker(request, preload) for _ in range(args.repeat)]
+            import_seconds = np.median([run["import_seconds"] for run in runs])
+            request_seconds = "" if not request else f"{np.median([run['request_seconds'] for run in runs]):.2f}"
+            rss = np.median([run["peak_rss_bytes"] for run in runs]) / 2**20
+
+            print(f"{preload or '-':<10} {request or '-':<34} {import_seconds:>9.2f} {request_seconds:>10} {rss:>8.0f} "
+                  f"{runs[-1]['modules']:>8}  {', '.join(runs[-1]['heavy'])}")
+
+if __name__ == "__main__":
+    main()
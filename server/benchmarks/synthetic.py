@@ -0,0 +1,56 @@
+import os
+import json
+import numpy as np
+
+def synthetic_gestures(n_channels=16, n_gestures=5, n_trials=10, n_samples=1000, seed=42):
+    """
+    Generate a synthetic EMG dataset in the gesture dict format read by get_data.
+
+    Every gesture activates a random subset of channels with its own gain profile on top
+    of white noise, trial lengths vary by +-10 %. Gesture 0 is rest (noise only).
+
+    Returns:
+    - gestures: dict mapping gesture numbers to lists of (samples, channels) arrays.
+    """
+    rng = np.random.default_rng(seed)
+
+    gestures = {}
+
+    for g in range(n_gestures):
+        if g == 0:
+            profile = np.full(n_channels, 0.1)
+        else:
+            profile = 0.1 + rng.random(n_channels) * (rng.random(n_channels) < 0.4)
+
+        gestures[g] = []
+
+        for _ in range(n_trials):
+            length = int(n_samples * rng.uniform(0.9, 1.1))
+            gain = profile * rng.uniform(0.6, 1.4, n_channels)
+            gestures[g].append(rng.standard_normal((length, n_channels)) * gain)
+
+    return gestures
+
+def dataset_shapes(metadata_dir="../datasets"):
+    """
+    Read the electrode count and gesture ids of every dataset_metadata*.json below metadata_dir.
+
+    Returns:
+    - shapes: dict mapping dataset names to (n_channels, gesture ids) with the ids sorted and unique.
+    """
+    shapes = {}
+
+    for root, _, files in sorted(os.walk(metadata_dir)):
+        for name in sorted(files):
+            if name.startswith("dataset_metadata") and name.endswith(".json"):
+                with open(os.path.join(root, name)) as f:
+                    metadata = json.load(f)
+                ids = sorted({gesture["id"] for cls in metadata["gesture_classes"] for gesture in cls["gestures"]})
+                shapes[metadata["dataset_name"]] = (metadata["number_of_electrodes"], ids)
+
+    return shapes
+
+def synthetic_dataset(n_channels, gesture_ids, n_trials=10, n_samples=1000, seed=42):
+    """Synthetic gestures keyed by the dataset's own gesture ids, the lowest id being rest."""
+    gestures = synthetic_gestures(n_channels, len(gesture_ids), n_trials, n_samples, seed)
+    return {g: gestures[i] for i, g in enumerate(gesture_ids)}
@@ -0,0 +1,53 @@
+"""GestureDataset packed in memory and memory-mapped from the columnar layout."""
+import pickle
+
+import numpy as np
+import pytest
+
+from app import GestureDataset, channel_index, convert_to_columnar, pack_samples, select_data
+
+def ragged_gestures(n_channels=12, seed=0):
+    rng = np.random.default_rng(seed)
+    return {g: [rng.standard_normal((int(rng.integers(50, 300)), n_channels)) for _ in range(4)] for g in range(4)}
+
+@pytest.fixture(params=["float64", "float32", "int16"])
+def datasets(request, tmp_path):
+    gestures = ragged_gestures()
+    path = convert_to_columnar(gestures, str(tmp_path / "dataset.emg"), dtype=request.param)
+    return GestureDataset.from_gestures(gestures, request.param), GestureDataset.open(path)
+
+def assert_same_trials(a, b):
+    assert a.keys() == b.keys()
+    for g in a:
+        assert len(a[g]) == len(b[g])
+        for x, y in zip(a[g], b[g]):
+            np.testing.assert_array_equal(x, y)
+
+@pytest.mark.parametrize("selected_gestures", [[], [1, 3]])
+@pytest.mark.parametrize("channels", [[], [2], [0, 3, 6, 9], [11, 2, 5, 4]])
+def test_mapped_selection_matches_packed(datasets, selected_gestures, channels):
+    packed, mapped = datasets
+
+    a, class_map = select_data(mapped, selected_gestures, channels)
+    b, _ = select_data(packed, selected_gestures, channels)
+
+    assert_same_trials(a, b)
+    for x, y in zip(pack_samples(a, ufunc=np.square), pack_samples(b, ufunc=np.square)):
+        np.testing.assert_array_equal(x, y)
+
+    # trials that are not contiguous in the buffer any more
+    a, b = a.select([0, 2]), b.select([0, 2])
+    segments = [(5, 40)] * len(a.offsets)
+    for x, y in zip(pack_samples(a.crop(segments)), pack_samples(b.crop(segments))):
+        np.testing.assert_array_equal(x, y)
+
+def test_mapped_selection_pickles_as_its_files(datasets):
+    packed, mapped = datasets
+    selected = mapped.select([1, 2], channel_index([4, 1, 7]))
+
+    restored = pickle.loads(pickle.dumps(selected))
+
+    assert restored.path == mapped.path
+    assert isinstance(restored.buffer, np.memmap)
+    assert_same_trials(restored, selected)
+    assert_same_trials(pickle.loads(pickle.dumps(packed.select([3]))), packed.select([3]))
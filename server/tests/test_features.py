@@ -0,0 +1,54 @@
+"""calculate_features against the per-sample loop it replaced."""
+import numpy as np
+import pytest
+
+from app import calculate_features
+
+def reference_features(gestures, channels=None):
+    """The former implementation: three windows per sample, RMS normalized by its channel mean."""
+    features = []
+    labels = []
+
+    for g in gestures.keys():
+        for sample in gestures[g]:
+            feature_set = []
+            window_len = len(sample) // 3
+            if channels is None:
+                windows = [sample[window_len * i:window_len * (i + 1)] for i in range(3)]
+            else:
+                windows = [sample[window_len * i:window_len * (i + 1), channels] for i in range(3)]
+            for w in windows:
+                rms_per_channel = np.sqrt(np.mean(np.square(w), axis=0))
+                feature_set.extend(rms_per_channel / np.mean(rms_per_channel))
+            features.append(feature_set)
+            labels.append(g)
+
+    return np.array(features), np.array(labels)
+
+def ragged_gestures(n_channels=12, n_gestures=4, n_trials=5, seed=0):
+    """Trials of different lengths, including lengths that do not divide into three windows."""
+    rng = np.random.default_rng(seed)
+    return {
+        g: [rng.standard_normal((int(rng.integers(31, 400)), n_channels)) * rng.uniform(0.5, 2, n_channels)
+            for _ in range(n_trials)]
+        for g in range(n_gestures)
+    }
+
+@pytest.mark.parametrize("channels", [None, [3], [0, 2, 4, 6], [7, 1, 10], list(range(12))])
+def test_matches_per_sample_loop(channels):
+    gestures = ragged_gestures()
+
+    features, labels = calculate_features(gestures, channels)
+    expected_features, expected_labels = reference_features(gestures, channels)
+
+    np.testing.assert_array_equal(labels, expected_labels)
+    np.testing.assert_allclose(features, expected_features, rtol=1e-12, atol=0)
+
+def test_cached_channel_subset_matches_uncached():
+    gestures = ragged_gestures(seed=1)
+    channels = [5, 0, 9]
+
+    cached, _ = calculate_features(gestures, channels, cache_key=("test_features", 1))
+    uncached, _ = calculate_features(gestures, channels)
+
+    np.testing.assert_allclose(cached, uncached, rtol=1e-12, atol=0)
@@ -0,0 +1,57 @@
+"""Trained layouts in the model registry and /ws/classify."""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "model_registry", app.ModelRegistry(str(tmp_path)))
+    return TestClient(app.app)
+
+@pytest.mark.parametrize("model_id", [123, None, [1], {"id": 1}, "../models", ""])
+def test_unknown_model_ids(client, model_id):
+    assert app.model_registry.get(model_id) is None
+    assert app.model_registry.meta(model_id) is None
+
+    with client.websocket_connect("/ws/classify") as ws:
+        ws.send_json({"model_id": model_id})
+        assert ws.receive_json() == {"error": "unknown model_id, train the layout first"}
+
+def test_streaming_filter_matches_preprocessing_magnitude():
+    rng = np.random.default_rng(0)
+    signal = rng.standard_normal((40000, 3)) + np.sin(2 * np.pi * 50 * np.arange(40000) / 2000)[:, None]
+    stream = app.StreamingFilter(app.filter_sos(2000), 3)
+
+    filtered = np.concatenate([stream.push(signal[i:i + 64]) for i in range(0, len(signal), 64)])
+    expected = app.preprocess(signal, 2000)
+
+    # the same magnitude response, only the phase differs; the start is the filter's transient
+    np.testing.assert_allclose(app.compute_rms(filtered[2000:]), app.compute_rms(expected[2000:]), rtol=0.02)
+
+class LoudestChannel:
+    """Predicts the index of the channel with the largest feature in the first window."""
+    def predict(self, features):
+        return [int(np.argmax(features[0, :2]))]
+
+def test_preprocessed_layouts_filter_live_frames(client, monkeypatch):
+    layout = {"model": LoudestChannel(), "channels": [3, 7], "classes": [0, 1], "n_windows": 3, "window_len": 200,
+              "fs": 2000, "apply_preprocess": True}
+    app.model_registry.put("00ff", layout)
+    # the preprocessing config is read back from meta.json
+    monkeypatch.setattr(app, "model_registry", app.ModelRegistry(app.model_registry.path))
+
+    # channel 0 carries 50 Hz mains hum only, which the notch removes
+    t = np.arange(2400) / 2000
+    rng = np.random.default_rng(1)
+    frame = np.stack([5 * np.sin(2 * np.pi * 50 * t), rng.standard_normal(len(t))], axis=1).astype(np.float32)
+
+    with client.websocket_connect("/ws/classify") as ws:
+        ws.send_json({"model_id": "00ff"})
+        assert ws.receive_json() == {"channels": [3, 7], "window_len": 200, "fs": 2000}
+        ws.send_bytes(frame.tobytes())
+        assert ws.receive_json()["prediction"] == 1
+
+    unfiltered = app.LayoutClassifier(dict(layout, apply_preprocess=False))
+    assert unfiltered.push(frame) == 0
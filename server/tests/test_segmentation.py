@@ -0,0 +1,114 @@
+"""segment_gestures boundaries against the per-window loop it replaced."""
+import numpy as np
+import pytest
+from scipy.signal import medfilt
+
+from app import GestureDataset, crop_segments, segment_gesture, segment_gestures
+
+WINDOW_SIZE = 150
+
+def reference_segment(data, rest_rms, window_size=WINDOW_SIZE, median_filter_size=3):
+    """The former implementation of segment_gesture, one window and one trial at a time."""
+    num_windows = data.shape[0] // window_size
+    rms_values = np.array([np.sqrt(np.mean(np.square(data[i * window_size:(i + 1) * window_size]), axis=0)) - rest_rms
+                           for i in range(num_windows)])
+    rms_values_filtered = np.array([medfilt(i, median_filter_size) for i in rms_values])
+    summarized_rms = np.sum(rms_values_filtered, axis=1)
+    threshold = np.mean(summarized_rms)
+    active_windows = summarized_rms > threshold
+
+    for i in range(1, len(active_windows) - 1):
+        if not active_windows[i] and active_windows[i - 1] and active_windows[i + 1]:
+            active_windows[i] = True
+
+    max_length, best_start, current_length, current_start = 0, 0, 0, None
+    for i, active in enumerate(active_windows):
+        if active:
+            if current_start is None:
+                current_start = i
+            current_length += 1
+        else:
+            if current_length > max_length:
+                max_length, best_start = current_length, current_start
+            current_length, current_start = 0, None
+    if current_length > max_length:
+        max_length, best_start = current_length, current_start
+
+    return best_start * window_size, (best_start + max_length) * window_size
+
+def stepped_trial(amplitudes, n_channels=6, tail=0):
+    """A trial whose windows have the given RMS on every channel, plus tail samples of a partial window."""
+    sign = np.where(np.arange(WINDOW_SIZE) % 2, -1.0, 1.0)[:, None]
+    windows = [a * sign * np.ones((1, n_channels)) for a in amplitudes]
+    return np.concatenate(windows + [np.ones((tail, n_channels))])
+
+def burst_trials(n_trials=40, n_channels=16, seed=0):
+    """Noise trials of ragged length with one or two bursts of activity on random channels."""
+    rng = np.random.default_rng(seed)
+    trials = []
+    for _ in range(n_trials):
+        length = int(rng.integers(WINDOW_SIZE, 25 * WINDOW_SIZE))
+        trial = rng.standard_normal((length, n_channels)) * 0.1
+        for _ in range(int(rng.integers(1, 3))):
+            start = int(rng.integers(0, length))
+            stop = min(length, start + int(rng.integers(WINDOW_SIZE // 2, 8 * WINDOW_SIZE)))
+            trial[start:stop] *= rng.uniform(1, 20, n_channels)
+        trials.append(trial)
+    return trials
+
+@pytest.mark.parametrize("median_filter_size", [3, 5])
+def test_matches_per_window_loop(median_filter_size):
+    trials = burst_trials(seed=median_filter_size)
+    rest_rms = np.full(16, 0.1)
+
+    segments = segment_gestures(trials, rest_rms, WINDOW_SIZE, median_filter_size)
+
+    assert segments == [reference_segment(t, rest_rms, WINDOW_SIZE, median_filter_size) for t in trials]
+
+@pytest.mark.parametrize("median_filter_size", [3, 5])
+@pytest.mark.parametrize("amplitudes, tail, expected", [
+    # a single burst, the partial window at the end is ignored
+    ([1, 1, 5, 5, 5, 1, 1, 1], 100, (300, 750)),
+    # single inactive windows between active ones are filled
+    ([1, 5, 1, 5, 1, 1, 1, 1], 0, (150, 600)),
+    # two runs of the same length, the first one wins
+    ([1, 5, 5, 1, 1, 5, 5, 1], 0, (150, 450)),
+    ([5, 5, 1, 1, 1, 1, 5, 5], 0, (0, 300)),
+    # a longer later run beats an earlier one
+    ([5, 1, 1, 5, 5, 1, 1, 1], 0, (450, 750)),
+    # active up to the last window
+    ([1, 1, 1, 1, 1, 5, 5, 5], 149, (750, 1200)),
+])
+def test_golden_boundaries(amplitudes, tail, expected, median_filter_size):
+    trial = stepped_trial(amplitudes, tail=tail)
+
+    assert segment_gesture(trial, np.zeros(6), WINDOW_SIZE, median_filter_size) == expected
+    assert reference_segment(trial, np.zeros(6), WINDOW_SIZE, median_filter_size) == expected
+
+def test_trials_shorter_than_a_window():
+    rest_rms = np.full(6, 0.1)
+    short = stepped_trial([], tail=WINDOW_SIZE - 1)
+    burst = stepped_trial([1, 5, 5, 1])
+
+    assert segment_gesture(short, rest_rms) == (0, 0)
+    assert segment_gesture(np.empty((0, 6)), rest_rms) == (0, 0)
+    # a short trial in the middle of a batch does not shift its neighbours' windows
+    assert segment_gestures([burst, short, burst], rest_rms) == [(150, 450), (0, 0), (150, 450)]
+
+def test_dataset_matches_trial_lists():
+    trials = burst_trials(n_trials=12, seed=7)
+    rest_rms = np.full(16, 0.1)
+    gestures = {0: trials[:5], 1: trials[5:]}
+
+    dataset = GestureDataset.from_gestures(gestures)
+
+    assert segment_gesture(dataset, rest_rms) == segment_gestures(trials, rest_rms)
+
+def test_crop_segments_keeps_trials_without_a_segment():
+    dataset = GestureDataset.from_gestures({0: [np.arange(10.0)[:, None]], 1: [np.arange(10.0)[:, None]] * 3},
+                                           dtype=np.float64)
+
+    cropped = crop_segments(dataset, [(1, 5), (2, 8), (0, 0), (4, 6)], keep=[0])
+
+    assert [len(t) for t in cropped[0] + cropped[1]] == [10, 6, 10, 10]
+    np.testing.assert_array_equal(cropped[1][0][:, 0], np.arange(2.0, 8.0))
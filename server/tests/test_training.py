@@ -0,0 +1,54 @@
+"""run_training end to end on small uploaded datasets."""
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import app
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    """Upload, preprocessing and model directories of their own."""
+    monkeypatch.setattr(app, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(app, "PREPROCESS_DIR", str(tmp_path / "preprocessed"))
+    monkeypatch.setattr(app, "model_registry", app.ModelRegistry(str(tmp_path / "models")))
+    os.makedirs(app.UPLOAD_DIR)
+
+    def upload(gestures, name="upload.pkl"):
+        with open(os.path.join(app.UPLOAD_DIR, name), "wb") as f:
+            pickle.dump(gestures, f)
+        return name
+
+    return upload
+
+def training_params(ds_filename, **overrides):
+    params = {
+        "ds_number": 0,
+        "ds_filename": ds_filename,
+        "selected_gestures": [],
+        "channels": [],
+        "fs": 2000,
+        "apply_preprocess": True,
+        "classifier": "KNN",
+        "metric": "RMS",
+        "no_of_channels": 4,
+        "area_no_of_channels": [],
+        "optimize_further": False,
+        "search": "prefix",
+        "search_budget": None,
+        "model_id": "0123abcd",
+    }
+    params.update(overrides)
+    return params
+
+def test_trials_shorter_than_two_segmentation_windows(uploads):
+    # 250 samples give a single 150 sample window, which segment_gestures reports as (0, 0)
+    rng = np.random.default_rng(0)
+    gestures = {g: [rng.standard_normal((250, 8)) * (1 + g * np.arange(8) % 3) for _ in range(6)] for g in range(3)}
+
+    result = app.run_training(training_params(uploads(gestures)), lambda **event: None)
+
+    assert len(result["best_channels"]) == 4
+    assert 0 <= result["accuracy"] <= 100
+    assert np.isfinite(result["f1"])
@@ -0,0 +1,56 @@
+"""Sharing of identical training requests through cached_training."""
+import asyncio
+import time
+
+import pytest
+
+import app
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """A fresh scheduler and an empty result store, so only the jobs of the test run."""
+    monkeypatch.setattr(app, "scheduler", app.JobScheduler(max_running=2, max_queued=4))
+    monkeypatch.setattr(app.result_store, "get", lambda key: None)
+    monkeypatch.setattr(app.result_store, "put", lambda key, result: None)
+    monkeypatch.setattr(app, "inflight_results", {})
+    return []
+
+async def ignore(event):
+    pass
+
+def test_identical_requests_share_one_job(jobs):
+    def job(progress):
+        jobs.append(time.monotonic())
+        time.sleep(0.1)
+        return {"ok": True}
+
+    async def main():
+        return await asyncio.gather(*[app.cached_training("key", job, ignore) for _ in range(3)])
+
+    assert asyncio.run(main()) == [{"ok": True}] * 3
+    assert len(jobs) == 1
+    assert app.inflight_results == {}
+
+def test_request_after_cancelled_job_starts_a_new_one(jobs):
+    def job(progress):
+        # a long stage without progress calls, the cancelled job only stops when it returns
+        jobs.append(time.monotonic())
+        time.sleep(0.3)
+        return {"run": len(jobs)}
+
+    async def main():
+        first = asyncio.ensure_future(app.cached_training("key", job, ignore))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.sleep(0.1)
+
+        # the first job is still running, it must not be joined
+        second = await app.cached_training("key", job, ignore)
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return second
+
+    assert asyncio.run(main()) == {"run": 2}
+    assert len(jobs) == 2
+    assert app.inflight_results == {}
@@ -0,0 +1,32 @@
+"""Uploads keep their identity when they are converted to the columnar layout."""
+import os
+import pickle
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "UPLOAD_DIR", str(tmp_path))
+    return TestClient(app.app)
+
+def gesture_pickle(n_channels=4, seed=0):
+    rng = np.random.default_rng(seed)
+    return pickle.dumps({g: [rng.standard_normal((200, n_channels)) for _ in range(4)] for g in range(3)})
+
+def test_digest_survives_columnar_conversion(client):
+    upload = client.put("/upload", content=gesture_pickle()).json()
+    filename = upload["filename"]
+
+    # the background conversion has run once the response is received
+    path = app.dataset_path(0, filename)
+    assert os.path.isdir(path)
+    assert app.dataset_digest(path) == app.dataset_digest(app.upload_path(upload["content_id"])) == upload["content_id"]
+
+def test_invalid_content_length(client):
+    response = client.put("/upload", content=gesture_pickle(), headers={"content-length": "twelve"})
+
+    assert response.status_code == 400